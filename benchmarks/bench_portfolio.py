@@ -0,0 +1,47 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from opat.portfolio import create_holdings, create_pnl, create_nav
+
+from .generators import SCALES, make_portfolio
+
+
+class Portfolio(object):
+    """create_holdings, create_pnl and create_nav on synthetic portfolios"""
+
+    params = ["small", "medium"]
+    param_names = ["scale"]
+    timeout = 600
+
+    def setup(self, scale):
+        self.trades, self.prices, self.flows = make_portfolio(**SCALES[scale])
+
+    def time_create_holdings(self, scale):
+        create_holdings(self.trades, self.prices)
+
+    def peakmem_create_holdings(self, scale):
+        create_holdings(self.trades, self.prices)
+
+    def time_create_pnl(self, scale):
+        create_pnl(self.trades, self.prices)
+
+    def peakmem_create_pnl(self, scale):
+        create_pnl(self.trades, self.prices)
+
+    def time_create_nav(self, scale):
+        create_nav(self.trades, self.prices, self.flows)
+
+    def peakmem_create_nav(self, scale):
+        create_nav(self.trades, self.prices, self.flows)
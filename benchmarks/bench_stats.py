@@ -0,0 +1,54 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from opat.stats import (cum_return, period_return, period_returns,
+                        annualized_return, annualized_std)
+
+from .generators import RETURN_SCALES, make_returns
+
+
+class Stats(object):
+    """Return statistics of synthetic daily fund returns"""
+
+    params = ["small", "medium", "large"]
+    param_names = ["scale"]
+    timeout = 600
+
+    def setup(self, scale):
+        self.returns = make_returns(*RETURN_SCALES[scale])
+
+    def time_cum_return(self, scale):
+        cum_return(self.returns)
+
+    def peakmem_cum_return(self, scale):
+        cum_return(self.returns)
+
+    def time_period_return(self, scale):
+        period_return(self.returns, "month")
+
+    def peakmem_period_return(self, scale):
+        period_return(self.returns, "month")
+
+    def time_period_returns(self, scale):
+        period_returns(self.returns)
+
+    def time_annualized_return(self, scale):
+        annualized_return(self.returns)
+
+    def time_annualized_std(self, scale):
+        annualized_std(self.returns)
+
+    def peakmem_annualized_std(self, scale):
+        annualized_std(self.returns)
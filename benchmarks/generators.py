@@ -0,0 +1,70 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pandas as pd
+
+from opat.synthetic import generate
+
+# Sizes of the synthetic portfolios, the test data has 1 account, 20
+# tickers, 1 year and 43 trades
+SCALES = {
+    "small": {"accounts": 2, "tickers": 20, "years": 2, "trades_per_day": 2},
+    "medium": {"accounts": 10, "tickers": 200, "years": 5,
+               "trades_per_day": 20},
+    "large": {"accounts": 50, "tickers": 1000, "years": 10,
+              "trades_per_day": 100},
+}
+
+# Sizes of the synthetic return frames, as (years of daily returns, funds)
+RETURN_SCALES = {
+    "small": (2, 10),
+    "medium": (10, 1000),
+    "large": (20, 10000),
+}
+
+
+def make_portfolio(accounts, tickers, years, trades_per_day, seed=0):
+    """Trades, prices and flows of one synthetic portfolio
+
+    Returns:
+        [tuple] -- trades, prices and flows DataFrames
+    """
+
+    chunks = generate(accounts, tickers, years, trades_per_day, seed=seed)
+    return tuple(pd.concat(frames, ignore_index=True)
+                 for frames in zip(*chunks))
+
+
+def make_returns(years, funds, seed=0, start="2010-01-01"):
+    """Daily returns of funds, indexed by business day
+
+    Arguments:
+        years {int} -- number of years of business days
+        funds {int} -- number of funds
+
+    Keyword Arguments:
+        seed {int} -- random seed (default: {0})
+        start {str} -- first day (default: {"2010-01-01"})
+
+    Returns:
+        [DataFrame] -- one column of returns per fund
+    """
+
+    rng = np.random.RandomState(seed)
+    days = pd.bdate_range(start, periods=261 * years, name="Date")
+    return pd.DataFrame(rng.normal(0.0003, 0.01, size=(len(days), funds)),
+                        index=days,
+                        columns=["F{:05d}".format(i) for i in range(funds)])
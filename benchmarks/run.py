@@ -0,0 +1,203 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Run the benchmarks without asv, save the results and compare them
+
+The benchmark classes follow the asv conventions, so ``asv run`` works as
+well. This runner times each ``time_`` method, records the peak memory
+traced by tracemalloc for each ``peakmem_`` method, and writes the results
+to a JSON file. Given an earlier results file, it reports every benchmark
+that got slower or bigger by more than the threshold and exits with 1.
+
+Usage::
+
+    python -m benchmarks.run --scale small --save
+    python -m benchmarks.run --scale small --compare benchmarks/results/a.json
+"""
+
+import argparse
+import glob
+import importlib
+import inspect
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+__location__ = os.path.dirname(os.path.abspath(__file__))
+
+
+def discover(pattern=None):
+    """Benchmark classes of the bench_*.py modules
+
+    Keyword Arguments:
+        pattern {str} -- only keep benchmarks whose name contains pattern
+            (default: {None})
+
+    Returns:
+        [list] -- (name, class, method) of each benchmark
+    """
+
+    benchmarks = []
+    for path in sorted(glob.glob(os.path.join(__location__, "bench_*.py"))):
+        module = importlib.import_module(
+            "benchmarks." + os.path.basename(path)[:-3])
+        for _, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module.__name__:
+                continue
+            for method in sorted(vars(cls)):
+                if not method.startswith(("time_", "peakmem_")):
+                    continue
+                name = "{}.{}.{}".format(module.__name__.split(".")[-1],
+                                         cls.__name__, method)
+                if pattern is None or pattern in name:
+                    benchmarks.append((name, cls, method))
+    return benchmarks
+
+
+def measure(cls, method, param, repeat=3):
+    """Time or trace the memory of one benchmark with one parameter
+
+    Returns:
+        [float] -- the best of repeat wall times in seconds for time_
+            methods, the peak traced memory in bytes for peakmem_ methods
+    """
+
+    benchmark = cls()
+    benchmark.setup(param)
+    func = getattr(benchmark, method)
+
+    if method.startswith("peakmem_"):
+        tracemalloc.start()
+        func(param)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(param)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def environment():
+    """Versions and commit the results were measured with"""
+
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=__location__,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "date": datetime.now().isoformat(),
+            "python": platform.python_version(), "numpy": np.__version__,
+            "pandas": pd.__version__, "machine": platform.machine()}
+
+
+def run(scales, pattern=None, repeat=3):
+    """Run every benchmark for each scale it supports
+
+    Returns:
+        [dict] -- result of each "name[scale]"
+    """
+
+    results = {}
+    for name, cls, method in discover(pattern):
+        for scale in scales:
+            if scale not in cls.params:
+                continue
+            key = "{}[{}]".format(name, scale)
+            value = measure(cls, method, scale, repeat)
+            results[key] = value
+            unit = "MB" if method.startswith("peakmem_") else "s"
+            shown = value / 1e6 if unit == "MB" else value
+            print("{:<60} {:>12.4f} {}".format(key, shown, unit))
+            sys.stdout.flush()
+    return results
+
+
+def compare(results, previous, threshold):
+    """Benchmarks of results that are worse than previous by threshold
+
+    Returns:
+        [list] -- (name, previous, current) of each regression
+    """
+
+    regressions = []
+    for key, value in results.items():
+        before = previous.get(key)
+        if before and value > before * threshold:
+            regressions.append((key, before, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", action="append",
+                        help="scale to run, may be repeated "
+                        "(default: small and medium)")
+    parser.add_argument("--bench", help="only run benchmarks whose name "
+                        "contains this")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="number of timings, the best one is kept")
+    parser.add_argument("--save", nargs="?", const="",
+                        help="write the results to this file, or to "
+                        "benchmarks/results/<date>-<commit>.json")
+    parser.add_argument("--compare", help="results file to compare with")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="ratio to the compared result that counts as "
+                        "a regression")
+    args = parser.parse_args(argv)
+
+    scales = args.scale or ["small", "medium"]
+    results = run(scales, args.bench, args.repeat)
+    output = {"environment": environment(), "results": results}
+
+    if args.save is not None:
+        path = args.save
+        if not path:
+            name = "{}-{}.json".format(
+                datetime.now().strftime("%Y%m%d%H%M%S"),
+                output["environment"]["commit"])
+            path = os.path.join(__location__, "results", name)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+        print("Saved results to {}".format(path))
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            previous = json.load(f)["results"]
+        regressions = compare(results, previous, args.threshold)
+        for key, before, value in regressions:
+            print("REGRESSION {}: {:.4g} -> {:.4g} ({:.2f}x)".format(
+                key, before, value, value / before))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
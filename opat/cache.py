@@ -0,0 +1,395 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from . import __version__
+from .matrix import ReturnMatrix
+from .prices import PriceStore
+
+# Cache used by the functions decorated with cached, set by caching
+_active = None
+
+
+def _update(digest, value):
+    """Add the content of value to a hash"""
+    if isinstance(value, pd.DataFrame):
+        digest.update(b"DataFrame")
+        digest.update(repr(list(value.columns)).encode())
+        digest.update(repr(list(value.dtypes)).encode())
+        digest.update(repr((list(value.index.names),
+                            list(value.columns.names))).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values)
+    elif isinstance(value, pd.Series):
+        digest.update(b"Series")
+        digest.update(repr((value.name, value.dtype,
+                            list(value.index.names))).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values)
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).view(np.uint8))
+    elif isinstance(value, PriceStore):
+        digest.update(b"PriceStore")
+        _update(digest, list(value.tickers))
+        _update(digest, value.keys)
+        for column in value.columns:
+            digest.update(column.encode())
+            _update(digest, value.values[column])
+    elif isinstance(value, (list, tuple)):
+        digest.update(repr((type(value).__name__, len(value))).encode())
+        for item in value:
+            _update(digest, item)
+    elif isinstance(value, dict):
+        _update(digest, sorted(value.items(), key=repr))
+    elif value is None or isinstance(value, (str, bytes, int, float, bool,
+                                             date)):
+        digest.update(repr(value).encode())
+    else:
+        digest.update(pickle.dumps(value))
+
+
+def fingerprint(*values):
+    """
+    Content hash of values
+
+    DataFrames and Series are hashed by their values, index, columns,
+    dtypes and the names of the index and columns, so equal data gives the
+    same fingerprint whatever object holds it.
+
+    Parameters
+    ----------
+    values : objects to hash
+
+    Returns
+    -------
+    fingerprint : str
+        Hex digest of the values.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    for value in values:
+        _update(digest, value)
+    return digest.hexdigest()
+
+
+def _nbytes(value):
+    """Approximate memory used by a cached value"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return len(pickle.dumps(value))
+
+
+def _has_matrix(args, kwargs):
+    """Whether any argument of a call is a ReturnMatrix"""
+    return any(isinstance(value, ReturnMatrix)
+               for value in list(args) + list(kwargs.values()))
+
+
+@contextmanager
+def _suspended():
+    """Call the cached functions without a cache within a block"""
+    global _active
+
+    previous = _active
+    _active = None
+    try:
+        yield
+    finally:
+        _active = previous
+
+
+def _copy(value):
+    """
+    A copy of a cached result that has a copy method, such as a frame or
+    SparseHoldings, so callers cannot change the cache
+    """
+    copy = getattr(value, "copy", None)
+    if copy is None:
+        return value
+    return copy()
+
+
+class Cache(object):
+    """
+    Cache of function results keyed by a content hash of their arguments
+
+    Results are kept in memory in least recently used order, and optionally
+    pickled to a directory, so they survive between processes. Both stores
+    evict their least recently used results when they are over their size
+    limits. Keys include the opat version, so results stored by another
+    version are never read back.
+
+    Calls with a ReturnMatrix argument are not cached, nor are the calls
+    made on its chunks: its values are on disk, can be larger than memory
+    and can change, and a result written to out must be written every time.
+
+    Parameters
+    ----------
+    max_items : int, optional
+        Maximum number of results kept in memory
+    max_bytes : int, optional
+        Maximum memory used by the results kept in memory, unlimited by
+        default
+    path : str, optional
+        Directory of the on-disk store, no disk store by default
+    max_disk_bytes : int, optional
+        Maximum size of the on-disk store, unlimited by default
+    """
+
+    def __init__(self, max_items=128, max_bytes=None, path=None,
+                 max_disk_bytes=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.path = path
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries or (
+            self.path is not None and os.path.exists(self._file(key)))
+
+    @property
+    def stats(self):
+        """Hit, miss and eviction counters and the size of the cache"""
+        return {"hits": self.hits, "misses": self.misses,
+                "disk_hits": self.disk_hits, "evictions": self.evictions,
+                "items": len(self.entries), "bytes": self.nbytes}
+
+    def key(self, func, *args, **kwargs):
+        """
+        Key of a call of func, the same for equal arguments however they
+        are passed, with the same version of opat.
+
+        Parameters
+        ----------
+        func : function called
+        args, kwargs : arguments of the call
+
+        Returns
+        -------
+        key : str
+        """
+        try:
+            bound = inspect.signature(func).bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = sorted(bound.arguments.items())
+        except (TypeError, ValueError):
+            arguments = [args, sorted(kwargs.items())]
+        name = "{}.{}".format(func.__module__, func.__qualname__)
+        return fingerprint(__version__, name, arguments)
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ".pkl")
+
+    def get(self, key, default=None):
+        """
+        Look up a result, from memory first and then from disk
+
+        Parameters
+        ----------
+        key : str, from key
+        default : returned when the key is not cached
+
+        Returns
+        -------
+        value : a copy of the cached result for frames
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return _copy(self.entries[key][0])
+
+        if self.path is not None and os.path.exists(self._file(key)):
+            with open(self._file(key), "rb") as f:
+                value = pickle.load(f)
+            os.utime(self._file(key))
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, value)
+            return _copy(value)
+
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """
+        Store a result in memory, and on disk if there is a disk store
+
+        Parameters
+        ----------
+        key : str, from key
+        value : result to store
+        """
+        self._remember(key, _copy(value))
+        if self.path is not None:
+            with open(self._file(key), "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._evict_disk()
+
+    def _remember(self, key, value):
+        """Keep a result in memory, evicting the least recently used"""
+        if key in self.entries:
+            self.nbytes -= self.entries.pop(key)[1]
+        size = _nbytes(value)
+        self.entries[key] = (value, size)
+        self.nbytes += size
+
+        while len(self.entries) > 1 and self._over_limit():
+            self.nbytes -= self.entries.popitem(last=False)[1][1]
+            self.evictions += 1
+
+    def _over_limit(self):
+        """Whether the results in memory are over the size limits"""
+        if len(self.entries) > self.max_items:
+            return True
+        return self.max_bytes is not None and self.nbytes > self.max_bytes
+
+    def _evict_disk(self):
+        """Remove the least recently used files over the disk limit"""
+        if self.max_disk_bytes is None:
+            return
+        files = [os.path.join(self.path, name)
+                 for name in os.listdir(self.path) if name.endswith(".pkl")]
+        files.sort(key=os.path.getmtime)
+        total = sum(os.path.getsize(name) for name in files)
+        for name in files[:-1]:
+            if total <= self.max_disk_bytes:
+                break
+            total -= os.path.getsize(name)
+            os.remove(name)
+            self.evictions += 1
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call func, or return its cached result for the same arguments
+
+        Parameters
+        ----------
+        func : function to call
+        args, kwargs : arguments of the call
+
+        Returns
+        -------
+        result : the result of func
+        """
+        if _has_matrix(args, kwargs):
+            with _suspended():
+                return func(*args, **kwargs)
+
+        key = self.key(func, *args, **kwargs)
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = func(*args, **kwargs)
+            self.put(key, value)
+        return value
+
+    def memoize(self, func):
+        """
+        Decorate func to cache its results in this cache
+
+        Parameters
+        ----------
+        func : function to decorate
+
+        Returns
+        -------
+        wrapper : function
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        return wrapper
+
+    def clear(self):
+        """Remove all results, from memory and disk"""
+        self.entries.clear()
+        self.nbytes = 0
+        if self.path is not None:
+            for name in os.listdir(self.path):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self.path, name))
+
+
+def cached(func):
+    """
+    Decorate an opat function to use the active cache, set by caching
+
+    Without an active cache the function is called as it is, so caching is
+    opt in.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _active is None:
+            return func(*args, **kwargs)
+        return _active.call(func, *args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def caching(cache=None):
+    """
+    Cache the results of create_holdings, create_pnl, create_nav,
+    create_dividends, cum_return and period_return within a block,
+    including the calls they make to each other
+
+    Example::
+
+        with caching(Cache(path="cache")) as cache:
+            holdings = create_holdings(trades, prices)
+            pnl = create_pnl(trades, prices)
+        print(cache.stats)
+
+    Parameters
+    ----------
+    cache : Cache, optional
+        Cache to use, a new in-memory cache by default
+
+    Returns
+    -------
+    cache : Cache
+    """
+    global _active
+
+    if cache is None:
+        cache = Cache()
+    previous = _active
+    _active = cache
+    try:
+        yield cache
+    finally:
+        _active = previous
@@ -0,0 +1,257 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pandas as pd
+
+from .stats import (_exp_growth, _growth_signs, _log_growth, _values, _wrap,
+                    _wrap_total)
+
+
+def _drawdowns(returns):
+    """
+    Drawdown of every column and the row of its last peak
+
+    The wealth index is vami scaled to start at 1, and the peak is its
+    running maximum from np.maximum.accumulate, starting from the initial
+    value. All columns are processed together.
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of returns
+
+    Returns
+    -------
+    drawdown : np.ndarray
+        2D array of wealth over peak minus 1, one column per series
+    last_peak : np.ndarray
+        2D array of the row of the last peak on or before each row, -1 for
+        the initial value
+    """
+    values = _values(returns)
+    if values.ndim == 1:
+        values = values.reshape(-1, 1)
+
+    wealth = _log_growth(values)
+    np.cumsum(wealth, axis=0, out=wealth)
+    signs = _growth_signs(values)
+    if signs is not None:
+        signs = tuple(np.cumsum(count, axis=0) for count in signs)
+    _exp_growth(wealth, signs, out=wealth)
+
+    peak = np.maximum.accumulate(wealth, axis=0)
+    np.maximum(peak, 1, out=peak)
+
+    rows = np.arange(len(values))[:, None]
+    last_peak = np.where(wealth >= peak, rows, -1)
+    np.maximum.accumulate(last_peak, axis=0, out=last_peak)
+
+    wealth /= peak
+    wealth -= 1
+
+    return wealth, last_peak
+
+
+def _unwrap(values, returns):
+    """Undo the reshape of a Series into one column"""
+    if isinstance(returns, pd.DataFrame):
+        return values
+    return values[..., 0]
+
+
+def drawdown(returns):
+    """
+    Compute the drawdown series, the loss from the highest value so far
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of periodic returns
+
+    Returns
+    -------
+    drawdown : array-like
+        Drawdown on each date, 0 at a new high and negative below it.
+    """
+    if len(returns) < 1:
+        return returns.copy()
+
+    return _wrap(_unwrap(_drawdowns(returns)[0], returns), returns)
+
+
+def max_drawdown(returns):
+    """
+    Compute the maximum drawdown, the largest loss from a peak
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of periodic returns
+
+    Returns
+    -------
+    max_drawdown : float or pd.Series
+        Most negative drawdown of each series.
+    """
+    if len(returns) < 1:
+        return returns.copy()
+
+    values = _drawdowns(returns)[0]
+
+    return _wrap_total(_unwrap(values.min(axis=0), returns), returns)
+
+
+def drawdown_duration(returns):
+    """
+    Compute how long each date has been in drawdown
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of periodic returns
+
+    Returns
+    -------
+    duration : array-like
+        Number of periods since the last peak, 0 at a new high.
+    """
+    if len(returns) < 1:
+        return returns.copy()
+
+    last_peak = _drawdowns(returns)[1]
+    duration = np.arange(len(returns))[:, None] - last_peak
+
+    return _wrap(_unwrap(duration, returns), returns)
+
+
+def recovery_time(returns):
+    """
+    Compute the time from the bottom of the maximum drawdown back to the
+    previous peak
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of periodic returns
+
+    Returns
+    -------
+    recovery_time : float or pd.Series
+        Number of periods from the trough to the first date back at the
+        peak, nan if it has not recovered yet.
+    """
+    if len(returns) < 1:
+        return returns.copy()
+
+    values, last_peak = _drawdowns(returns)
+    rows = np.arange(len(values))[:, None]
+
+    trough = values.argmin(axis=0)
+    recovered = (last_peak > trough) & (rows > trough)
+    first = recovered.argmax(axis=0)
+    result = np.where(recovered.any(axis=0), first - trough, np.nan)
+    result[values.min(axis=0) == 0] = 0
+
+    return _wrap_total(_unwrap(result, returns), returns)
+
+
+def top_drawdowns(returns, n=5):
+    """
+    Table of the n largest drawdowns of each series
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of periodic returns
+    n : int, optional
+        Number of drawdowns to return per series
+
+    Returns
+    -------
+    drawdowns : pd.DataFrame
+        One row per drawdown, largest first, with
+         - peak: last date at the high, the first date when the drawdown
+           starts from the initial value
+         - trough: date of the lowest value
+         - recovery: first date back at the high, NaT if not recovered
+         - drawdown: loss from peak to trough
+         - duration: number of periods from the peak to the recovery, or to
+           the last date if not recovered
+        For a DataFrame, the index is (column, rank).
+    """
+    if returns.size < 1:
+        return _no_drawdowns(returns)
+
+    values, last_peak = _drawdowns(returns)
+    length, width = values.shape
+
+    # Each column is a run of drawdown episodes, one per peak. Flattened
+    # column by column, every episode is a contiguous segment of one key
+    key = (np.arange(width) * (length + 1) + last_peak + 1).ravel(order="F")
+    flat = values.ravel(order="F")
+    starts = np.flatnonzero(np.append(True, key[1:] != key[:-1]))
+    ends = np.append(starts[1:], len(key))
+
+    depth = np.minimum.reduceat(flat, starts)
+    matches = np.flatnonzero(flat == np.repeat(depth, ends - starts))
+    trough = matches[np.searchsorted(matches, starts)]
+
+    column = starts // length
+    peak = last_peak.ravel(order="F")[starts]
+    next_column = np.append(column[1:], -1)
+    recovered = next_column == column
+    recovery = np.where(recovered, np.append(starts[1:], 0) % length, -1)
+    end = np.where(recovered, recovery, length - 1)
+
+    # Largest drawdowns of each column first
+    order = np.lexsort((depth, column))
+    order = order[depth[order] < 0]
+    first = np.searchsorted(column[order], column[order])
+    rank = np.arange(len(order)) - first
+    order = order[rank < n]
+    rank = rank[rank < n]
+
+    dates = returns.index
+    result = pd.DataFrame({
+        "peak": dates[np.maximum(peak[order], 0)],
+        "trough": dates[trough[order] % length],
+        "recovery": dates[np.maximum(recovery[order], 0)].where(
+            recovered[order]),
+        "drawdown": depth[order],
+        "duration": end[order] - peak[order],
+    })
+
+    if isinstance(returns, pd.DataFrame):
+        result.index = pd.MultiIndex.from_arrays(
+            [returns.columns[column[order]], rank])
+    else:
+        result.index = rank
+
+    return result
+
+
+def _no_drawdowns(returns):
+    """Table of top_drawdowns without rows, for returns without values"""
+    dates = returns.index[:0]
+    result = pd.DataFrame({
+        "peak": dates,
+        "trough": dates,
+        "recovery": dates,
+        "drawdown": np.zeros(0),
+        "duration": np.zeros(0, dtype=np.int64),
+    })
+
+    rank = np.zeros(0, dtype=np.int64)
+    if isinstance(returns, pd.DataFrame):
+        result.index = pd.MultiIndex.from_arrays([returns.columns[:0], rank])
+    else:
+        result.index = rank
+
+    return result
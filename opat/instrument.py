@@ -0,0 +1,239 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Recorder used by stage and instrumented, set by instrumenting
+_active = None
+
+
+class _Stage(object):
+    """An open stage, the code in it can set the number of rows handled"""
+
+    __slots__ = ("name", "start", "memory", "peak", "rows")
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+
+
+class Recorder(object):
+    """
+    Record the wall time, peak memory and row count of named stages
+
+    Stages can be nested, the time and memory of a stage include its inner
+    stages. Peak memory is the largest amount of memory allocated during
+    the stage above what was allocated when it started, as traced by
+    tracemalloc. Only stages run in the current process are recorded.
+
+    Parameters
+    ----------
+    memory : bool, optional
+        Trace the peak memory of each stage, which slows down the code
+        measured
+    callbacks : list, optional
+        Functions called with the event dict of each stage when it ends
+    """
+
+    def __init__(self, memory=True, callbacks=None):
+        self.memory = memory
+        self.callbacks = list(callbacks or [])
+        self.events = []
+        self.stack = []
+        self.origin = time.perf_counter()
+
+    def _enter(self, stage):
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            for outer in self.stack:
+                outer.peak = max(outer.peak, peak)
+            tracemalloc.reset_peak()
+            stage.memory = current
+            stage.peak = current
+        self.stack.append(stage)
+        stage.start = time.perf_counter()
+
+    def _exit(self, stage):
+        end = time.perf_counter()
+        self.stack.pop()
+        event = {"name": stage.name, "start": stage.start - self.origin,
+                 "duration": end - stage.start, "rows": stage.rows,
+                 "depth": len(self.stack), "peak_memory": None}
+        if self.memory:
+            peak = max(stage.peak, tracemalloc.get_traced_memory()[1])
+            if self.stack:
+                self.stack[-1].peak = max(self.stack[-1].peak, peak)
+            event["peak_memory"] = peak - stage.memory
+        self.events.append(event)
+        for callback in self.callbacks:
+            callback(event)
+
+    def report(self):
+        """
+        Summary of the recorded stages
+
+        Returns
+        -------
+        report : pd.DataFrame
+            One row per stage name in the order they started, with the
+            number of calls, the total and largest wall time in seconds,
+            the largest peak memory in bytes and the total rows.
+        """
+        columns = ["calls", "time", "max_time", "peak_memory", "rows"]
+        if not self.events:
+            return pd.DataFrame(columns=columns,
+                                index=pd.Index([], name="stage"))
+        events = pd.DataFrame(self.events).sort_values("start",
+                                                       kind="mergesort")
+        events["rows"] = events["rows"].astype(float)
+        grouped = events.groupby("name", sort=False)
+        report = pd.DataFrame({
+            "calls": grouped.size(),
+            "time": grouped["duration"].sum(),
+            "max_time": grouped["duration"].max(),
+            "peak_memory": grouped["peak_memory"].max(),
+            "rows": grouped["rows"].sum(min_count=1),
+        })
+        report.index.name = "stage"
+        return report[columns]
+
+    def chrome_trace(self, path=None):
+        """
+        The recorded stages in the Chrome trace event format, which can be
+        opened in chrome://tracing or Perfetto
+
+        Parameters
+        ----------
+        path : str, optional
+            File to write the trace to as JSON
+
+        Returns
+        -------
+        trace : dict
+        """
+        pid = os.getpid()
+        tid = threading.get_ident()
+        events = []
+        for event in self.events:
+            args = {"rows": event["rows"]}
+            if event["peak_memory"] is not None:
+                args["peak_memory"] = event["peak_memory"]
+            events.append({"name": event["name"], "ph": "X",
+                           "cat": event["name"].split(".")[0],
+                           "ts": event["start"] * 1e6,
+                           "dur": event["duration"] * 1e6,
+                           "pid": pid, "tid": tid, "args": args})
+        trace = {"traceEvents": events, "displayTimeUnit": "ms"}
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(trace, f)
+        return trace
+
+
+@contextmanager
+def stage(name):
+    """
+    Record a named stage of an opat function in the active recorder
+
+    Without an active recorder this does nothing. The yielded stage has a
+    rows attribute for the number of rows the stage produced.
+
+    Parameters
+    ----------
+    name : str, the function name and the stage, as "create_nav.merge"
+    """
+    current = _Stage(name)
+    recorder = _active
+    if recorder is None:
+        yield current
+        return
+
+    recorder._enter(current)
+    try:
+        yield current
+    finally:
+        recorder._exit(current)
+
+
+def _rows(value):
+    """Number of rows of a result, None if it has no length"""
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def instrumented(func):
+    """
+    Decorate an opat function to record its calls as a stage of the active
+    recorder, set by instrumenting
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _active is None:
+            return func(*args, **kwargs)
+        with stage(func.__name__) as current:
+            result = func(*args, **kwargs)
+            current.rows = _rows(result)
+        return result
+    return wrapper
+
+
+@contextmanager
+def instrumenting(recorder=None):
+    """
+    Record the stages of create_holdings, create_pnl and create_nav within
+    a block
+
+    Example::
+
+        with instrumenting() as recorder:
+            nav = create_nav(trades, prices, flows)
+        print(recorder.report())
+        recorder.chrome_trace("nav.json")
+
+    Parameters
+    ----------
+    recorder : Recorder, optional
+        Recorder to use, a new one tracing memory by default
+
+    Returns
+    -------
+    recorder : Recorder
+    """
+    global _active
+
+    if recorder is None:
+        recorder = Recorder()
+    started = recorder.memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    previous = _active
+    _active = recorder
+    try:
+        yield recorder
+    finally:
+        _active = previous
+        if started:
+            tracemalloc.stop()
@@ -0,0 +1,167 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pandas as pd
+
+from .prices import PRICE_COLUMNS
+
+
+def _import_pyarrow():
+    """Import pyarrow, which is only needed for the columnar cache"""
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("pyarrow is required for the columnar cache, "
+                          "install it with: pip install pyarrow")
+    return pyarrow
+
+
+def write_cache(data, path, partition_by="year", name="part"):
+    """Write trade, price or flow records to a partitioned Parquet dataset
+
+    Arguments:
+        data {DataFrame} -- records with a tradeday column
+        path {str} -- directory of the dataset
+
+    Keyword Arguments:
+        partition_by {str} -- "year", "ticker" or None (default: {"year"})
+        name {str} -- prefix of the file names, writes with a new name add
+            to the dataset instead of replacing earlier files (default:
+            {"part"})
+    """
+
+    pa = _import_pyarrow()
+
+    if partition_by not in ("year", "ticker", None):
+        raise ValueError("partition_by must be 'year', 'ticker' or None")
+
+    data = data.copy()
+    # Keep the price columns as float, so chunks with and without missing
+    # values have the same schema
+    for column in PRICE_COLUMNS:
+        if column in data:
+            data[column] = data[column].astype(float)
+    if partition_by == "year":
+        data["year"] = data["tradeday"].dt.year
+    partition_cols = [partition_by] if partition_by is not None else None
+
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    pa.parquet.write_to_dataset(
+        table, path, partition_cols=partition_cols,
+        basename_template=name + "-{i}.parquet",
+        existing_data_behavior="overwrite_or_ignore")
+
+
+def csv_to_cache(filepath, path, partition_by="year", chunksize=1000000):
+    """Convert a trade, price or flow csv file to a partitioned Parquet
+    dataset, one chunk of rows at a time
+
+    Arguments:
+        filepath {str} -- csv file with tradeday as the first column
+        path {str} -- directory of the dataset
+
+    Keyword Arguments:
+        partition_by {str} -- "year", "ticker" or None (default: {"year"})
+        chunksize {int} -- number of csv rows read at a time (default:
+            {1000000})
+    """
+
+    chunks = pd.read_csv(filepath, parse_dates=[0], header=0,
+                         chunksize=chunksize)
+    for i, chunk in enumerate(chunks):
+        write_cache(chunk, path, partition_by, name="chunk{}".format(i))
+
+
+def read_cache(path, columns=None, start_date=None, end_date=None,
+               tickers=None):
+    """Read records back from a dataset written by write_cache
+
+    Only the requested columns are read, and partitions outside of the
+    requested years or tickers are skipped.
+
+    Arguments:
+        path {str} -- directory of the dataset
+
+    Keyword Arguments:
+        columns {list} -- columns to read (default: {None}, all)
+        start_date {str or datetime} -- first tradeday to read (default:
+            {None})
+        end_date {str or datetime} -- last tradeday to read (default: {None})
+        tickers {list} -- tickers to read (default: {None}, all)
+
+    Returns:
+        [DataFrame] -- the records sorted by tradeday
+    """
+
+    pa = _import_pyarrow()
+    ds = pa.dataset
+
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    names = dataset.schema.names
+    tradeday = dataset.schema.field("tradeday").type
+
+    if columns is None:
+        columns = [name for name in names if name != "year"]
+    else:
+        columns = list(columns)
+
+    filters = []
+    if start_date is not None:
+        start_date = pd.Timestamp(start_date)
+        filters.append(ds.field("tradeday") >= pa.scalar(start_date,
+                                                         type=tradeday))
+        if "year" in names:
+            filters.append(ds.field("year") >= start_date.year)
+    if end_date is not None:
+        end_date = pd.Timestamp(end_date)
+        filters.append(ds.field("tradeday") <= pa.scalar(end_date,
+                                                         type=tradeday))
+        if "year" in names:
+            filters.append(ds.field("year") <= end_date.year)
+    if tickers is not None:
+        filters.append(ds.field("ticker").isin(list(tickers)))
+    expression = None
+    for condition in filters:
+        expression = condition if expression is None else \
+            expression & condition
+
+    table = dataset.to_table(columns=columns, filter=expression)
+    data = table.to_pandas()
+    data = data.sort_values(by="tradeday", kind="mergesort")
+
+    return data.reset_index(drop=True)
+
+
+def read_prices(path, start_date=None, end_date=None, tickers=None):
+    """Read the price columns used by the portfolio functions from a dataset
+    written by write_cache
+
+    Arguments:
+        path {str} -- directory of the dataset
+
+    Keyword Arguments:
+        start_date {str or datetime} -- first tradeday to read (default:
+            {None})
+        end_date {str or datetime} -- last tradeday to read (default: {None})
+        tickers {list} -- tickers to read (default: {None}, all)
+
+    Returns:
+        [DataFrame] -- tradeday, ticker, close, dividend and split
+    """
+
+    columns = ["tradeday", "ticker"] + list(PRICE_COLUMNS)
+    return read_cache(path, columns, start_date, end_date, tickers)
@@ -0,0 +1,250 @@
+#
+# Copyright 2018 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class ReturnMatrix(object):
+    """
+    Periodic returns of many series kept on disk and processed in chunks of
+    columns.
+
+    The values are a (dates x series) matrix in a memory-mapped .npy file,
+    stored column-major so each chunk of columns is one contiguous block, or
+    the columns of a memory-mapped Arrow IPC file. Functions in opat.stats
+    that accept a ReturnMatrix only hold one chunk of columns in memory at a
+    time.
+
+    Parameters
+    ----------
+    values : 2D array-like or list of 1D array-like
+        Matrix of returns, or one array per column
+    index : pd.DatetimeIndex
+        Dates of the rows
+    columns : list
+        Names of the columns
+    chunksize : int, optional
+        Number of columns processed at a time
+    """
+
+    def __init__(self, values, index, columns, chunksize=1000):
+        self.values = values
+        self.index = pd.DatetimeIndex(index)
+        self.columns = pd.Index(columns)
+        self.chunksize = chunksize
+
+    @property
+    def shape(self):
+        return (len(self.index), len(self.columns))
+
+    def __len__(self):
+        return len(self.index)
+
+    @classmethod
+    def create(cls, path, index, columns, chunksize=1000):
+        """
+        Create an empty memory-mapped return matrix.
+
+        Parameters
+        ----------
+        path : directory to create the matrix in
+        index : dates of the rows
+        columns : names of the columns
+        chunksize : int, optional
+            Number of columns processed at a time
+
+        Returns
+        -------
+        matrix : ReturnMatrix
+            Writable matrix filled with nan.
+        """
+        os.makedirs(path, exist_ok=True)
+        index = pd.DatetimeIndex(index)
+        values = np.lib.format.open_memmap(
+            os.path.join(path, "values.npy"), mode="w+", dtype=np.float64,
+            shape=(len(index), len(columns)), fortran_order=True)
+        values[:] = np.nan
+        np.save(os.path.join(path, "index.npy"), index.to_numpy())
+        with open(os.path.join(path, "columns.json"), "w") as f:
+            json.dump({"index": index.name,
+                       "columns": [str(column) for column in columns]}, f)
+
+        return cls(values, index, columns, chunksize)
+
+    @classmethod
+    def from_frame(cls, returns, path, chunksize=1000):
+        """
+        Write a DataFrame of returns to a memory-mapped return matrix.
+
+        Parameters
+        ----------
+        returns : pd.DataFrame of periodic returns
+        path : directory to write the matrix to
+        chunksize : int, optional
+            Number of columns processed at a time
+
+        Returns
+        -------
+        matrix : ReturnMatrix
+        """
+        matrix = cls.create(path, returns.index, returns.columns, chunksize)
+        for start in range(0, returns.shape[1], chunksize):
+            stop = start + chunksize
+            matrix.values[:, start:stop] = returns.iloc[:, start:stop]
+        matrix.values.flush()
+
+        return matrix
+
+    @classmethod
+    def open(cls, path, chunksize=1000):
+        """
+        Open a return matrix written by create or from_frame, read only.
+
+        Parameters
+        ----------
+        path : directory of the matrix
+        chunksize : int, optional
+            Number of columns processed at a time
+
+        Returns
+        -------
+        matrix : ReturnMatrix
+        """
+        values = np.load(os.path.join(path, "values.npy"), mmap_mode="r")
+        with open(os.path.join(path, "columns.json")) as f:
+            names = json.load(f)
+        index = pd.DatetimeIndex(np.load(os.path.join(path, "index.npy")),
+                                 name=names["index"])
+        columns = names["columns"]
+
+        return cls(values, index, columns, chunksize)
+
+    @classmethod
+    def from_arrow(cls, path, index_column="Date", chunksize=1000):
+        """
+        Open an Arrow IPC file of returns without reading it into memory.
+
+        Columns without missing values are used in place from the memory
+        map. Requires pyarrow.
+
+        Parameters
+        ----------
+        path : Arrow IPC (feather v2) file with one column per series
+        index_column : str, optional
+            Name of the date column
+        chunksize : int, optional
+            Number of columns processed at a time
+
+        Returns
+        -------
+        matrix : ReturnMatrix
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.ipc
+        except ImportError:
+            raise ImportError("pyarrow is required to read Arrow files, "
+                              "install it with: pip install pyarrow")
+
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        index = pd.DatetimeIndex(table.column(index_column).to_numpy(),
+                                 name=index_column)
+        columns = [name for name in table.column_names
+                   if name != index_column]
+        values = [table.column(name).to_numpy() for name in columns]
+
+        return cls(values, index, columns, chunksize)
+
+    def chunk(self, start, stop):
+        """
+        Columns start to stop as a DataFrame.
+
+        Parameters
+        ----------
+        start, stop : positions of the first and after last column
+
+        Returns
+        -------
+        returns : pd.DataFrame
+        """
+        if isinstance(self.values, list):
+            values = np.column_stack(self.values[start:stop])
+        else:
+            values = self.values[:, start:stop]
+
+        return pd.DataFrame(values, index=self.index,
+                            columns=self.columns[start:stop])
+
+    def chunks(self):
+        """
+        Iterate over the matrix in chunks of chunksize columns.
+
+        Returns
+        -------
+        chunks : generator of (start, stop, pd.DataFrame)
+        """
+        for start in range(0, len(self.columns), self.chunksize):
+            stop = min(start + self.chunksize, len(self.columns))
+            yield start, stop, self.chunk(start, stop)
+
+    def to_frame(self):
+        """
+        Read the whole matrix into a DataFrame.
+
+        Returns
+        -------
+        returns : pd.DataFrame
+        """
+        return self.chunk(0, len(self.columns))
+
+    def apply(self, func, out=None, **kwargs):
+        """
+        Apply a function of a DataFrame of returns chunk by chunk.
+
+        Parameters
+        ----------
+        func : function taking a pd.DataFrame of returns
+        out : str, optional
+            Directory for a memory-mapped output matrix. Only used when func
+            returns a DataFrame with the same dates as its input.
+        kwargs : passed to func
+
+        Returns
+        -------
+        result : pd.Series, pd.DataFrame or ReturnMatrix
+            The results of all chunks combined, a ReturnMatrix if out is
+            given.
+        """
+        results = []
+        for start, stop, returns in self.chunks():
+            result = func(returns, **kwargs)
+            if out is not None:
+                if not results:
+                    results.append(ReturnMatrix.create(
+                        out, result.index, self.columns, self.chunksize))
+                results[0].values[:, start:stop] = result
+            else:
+                results.append(result)
+
+        if out is not None:
+            results[0].values.flush()
+            return results[0]
+        if isinstance(results[0], pd.Series):
+            return pd.concat(results)
+        return pd.concat(results, axis=1)
@@ -0,0 +1,216 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+
+from .stats import _annualize, _exp_growth, _growth_signs, _log_growth
+
+
+class ReturnAccumulator(object):
+    """
+    Return statistics of a live feed of returns, updated one tick at a time
+
+    Only a fixed amount of state is kept per series: the number of returns,
+    the sum of log growth factors and the counts of negative and zero
+    growth factors, the running mean and sum of squared deviations
+    (Welford), and the first and last timestamp. The statistics
+    are the same as the batch functions of opat.stats give for the whole
+    history.
+
+    Parameters
+    ----------
+    starting_value : float, optional
+        Starting value of vami
+    """
+
+    def __init__(self, starting_value=1000):
+        self.starting_value = starting_value
+        self.columns = None
+        self.first = None
+        self.last = None
+        self.count = None
+        self.log_growth = None
+        self.negative = None
+        self.zero = None
+        self.mean = None
+        self.m2 = None
+
+    def update(self, timestamp, returns):
+        """
+        Add the returns of one tick.
+
+        Parameters
+        ----------
+        timestamp : datetime of the tick, not before the last tick
+        returns : float for a single series, or a pd.Series or dict of the
+            return of each series. Series missing from a tick count as
+            missing returns, new series are added.
+
+        Returns
+        -------
+        self : ReturnAccumulator
+        """
+        if isinstance(returns, dict):
+            returns = pd.Series(returns, dtype=float)
+        if isinstance(returns, pd.Series):
+            returns = returns.to_frame().T
+        else:
+            returns = pd.Series([returns], dtype=float)
+        returns.index = pd.DatetimeIndex([timestamp])
+
+        return self.extend(returns)
+
+    def extend(self, returns):
+        """
+        Add the returns of several ticks at once.
+
+        Parameters
+        ----------
+        returns : pd.Series of a single series or pd.DataFrame with one
+            column per series, indexed by the timestamps of the ticks
+
+        Returns
+        -------
+        self : ReturnAccumulator
+        """
+        if len(returns) < 1:
+            return self
+
+        index = pd.DatetimeIndex(returns.index)
+        if not index.is_monotonic_increasing or \
+                (self.last is not None and index[0] < self.last):
+            raise ValueError("Returns must be in time order, and not before "
+                             "the last tick {}".format(self.last))
+
+        values = self._align(returns)
+        if self.first is None:
+            self.first = index[0]
+        self.last = index[-1]
+
+        # Merge the statistics of the block into the running state
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        total = self.count + count
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.where(count > 0, np.nansum(values, axis=0) / count, 0)
+            deviations = np.where(valid, values - mean, 0)
+            m2 = (deviations ** 2).sum(axis=0)
+            delta = mean - self.mean
+            weight = np.where(total > 0, count / total, 0)
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * weight
+        self.count = total
+        self.log_growth = self.log_growth + _log_growth(values).sum(axis=0)
+        signs = _growth_signs(values)
+        if signs is not None:
+            self.negative = self.negative + signs[0].sum(axis=0)
+            self.zero = self.zero + signs[1].sum(axis=0)
+
+        return self
+
+    def _align(self, returns):
+        """The returns as a 2D array of the known series, adding new ones"""
+        if isinstance(returns, pd.Series):
+            if self.columns is not None:
+                raise ValueError("A series of returns can only be added to a "
+                                 "single series accumulator")
+            if self.count is None:
+                self._grow(1)
+            return returns.to_numpy(dtype=float).reshape(-1, 1)
+
+        if self.count is not None and self.columns is None:
+            raise ValueError("A frame of returns can only be added to a "
+                             "multiple series accumulator")
+        if self.columns is None:
+            self.columns = pd.Index([])
+            self._grow(0)
+        new = returns.columns.difference(self.columns, sort=False)
+        if len(new) > 0:
+            self.columns = self.columns.append(new)
+            self._grow(len(self.columns))
+
+        return returns.reindex(columns=self.columns).to_numpy(dtype=float)
+
+    def _grow(self, size):
+        """Add empty state for new series"""
+        for name in ("count", "log_growth", "negative", "zero", "mean", "m2"):
+            state = getattr(self, name)
+            if state is None:
+                state = np.zeros(0)
+            setattr(self, name, np.append(state, np.zeros(size - len(state))))
+
+    def _result(self, values):
+        """Wrap one value per series like the batch functions do"""
+        if self.columns is None:
+            return float(values[0])
+        return pd.Series(values, index=self.columns)
+
+    def _signs(self):
+        """Counts of negative and zero growth factors of each series"""
+        return self.negative, self.zero
+
+    def _years(self):
+        """Years from the first to the last tick"""
+        year = timedelta(days=365.25).total_seconds()
+        return (self.last - self.first).total_seconds() / year
+
+    def total_return(self):
+        """
+        Total return of each series so far, as total_return.
+
+        Returns
+        -------
+        total_returns : float or pd.Series
+        """
+        return self._result(_exp_growth(self.log_growth, self._signs(),
+                                        minus_one=True))
+
+    def vami(self):
+        """
+        Latest VAMI of each series, the last row of vami.
+
+        Returns
+        -------
+        vami : float or pd.Series
+        """
+        growth = _exp_growth(self.log_growth, self._signs())
+        return self._result(growth * self.starting_value)
+
+    def annualized_return(self):
+        """
+        Annualized return of each series so far, as annualized_return.
+
+        Returns
+        -------
+        annualized_returns : float or pd.Series
+        """
+        return self._result(_annualize(self.log_growth, self._years(),
+                                       self._signs()))
+
+    def annualized_std(self):
+        """
+        Annualized standard deviation of each series so far, as
+        annualized_std.
+
+        Returns
+        -------
+        annualized_std : float or pd.Series
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            std = np.sqrt(self.m2 / (self.count - 1))
+            std[self.count < 2] = np.nan
+            return self._result(std * np.sqrt(self.count / self._years()))
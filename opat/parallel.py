@@ -0,0 +1,190 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+
+from .portfolio import (create_holdings, create_pnl, create_nav,
+                        create_dividends, _last_date, _price_frame)
+from .prices import PRICE_COLUMNS
+
+
+def run_parallel(func, trades, prices, flows=None, shard_by="account",
+                 workers=None, shards=None, end_date=None):
+    """Run a portfolio function over shards of accounts or tickers in a
+    process pool
+
+    The prices are written once to memory-mapped files that every worker
+    opens, instead of being pickled to each of them, and each worker only
+    reads the prices of the tickers its shard trades. The combined result is
+    the same as calling the function on all the data at once, with
+    by_account=True when sharding by account.
+
+    Arguments:
+        func {function} -- create_holdings, create_pnl, create_nav or
+            create_dividends
+        trades {DataFrame} -- Daily trade data
+        prices {DataFrame} -- Daily price data, with dividend and split information,
+            or a PriceStore
+
+    Keyword Arguments:
+        flows {DataFrame} -- Cash flow data, required by create_nav
+            (default: {None})
+        shard_by {str} -- "account" or "ticker" (default: {"account"}). nav
+            can only be sharded by account, as the cash balance depends on
+            all tickers of an account
+        workers {int} -- number of worker processes (default: {None}, the
+            number of CPUs)
+        shards {int} -- number of shards to split the trades into (default:
+            {None}, the number of workers)
+        end_date {str or datetime} -- last day of the results (default:
+            {None}, the last day in prices)
+
+    Returns:
+        [DataFrame] -- the result of func on all shards combined
+    """
+
+    if func not in (create_holdings, create_pnl, create_nav,
+                    create_dividends):
+        raise ValueError("func must be create_holdings, create_pnl, "
+                         "create_nav or create_dividends")
+    if shard_by not in ("account", "ticker"):
+        raise ValueError("shard_by must be 'account' or 'ticker'")
+    if func is create_nav:
+        if flows is None:
+            raise ValueError("flows are required by create_nav")
+        if shard_by != "account":
+            raise ValueError("create_nav can only be sharded by account")
+
+    if workers is None:
+        workers = os.cpu_count()
+    if shards is None:
+        shards = workers
+
+    # All shards must end on the same day as the serial run
+    if end_date is None:
+        end_date = _last_date(prices)
+
+    keys = np.sort(trades[shard_by].unique())
+    groups = np.array_split(keys, max(min(shards, len(keys)), 1))
+
+    with tempfile.TemporaryDirectory() as folder:
+        store = _share_prices(_price_frame(prices), folder)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for group in groups:
+                shard = {"trades": trades[trades[shard_by].isin(group)]}
+                if func is create_nav:
+                    shard["flows"] = flows[flows[shard_by].isin(group)]
+                futures.append(executor.submit(
+                    _run_shard, func, shard, store, shard_by, end_date))
+            results = [future.result() for future in futures]
+
+    return _combine(results)
+
+
+def _share_prices(prices, folder):
+    """Write the price columns used by the portfolio functions to
+    memory-mapped files
+
+    Arguments:
+        prices {DataFrame} -- Daily price data
+        folder {str} -- directory to write the files to
+
+    Returns:
+        [dict] -- location and metadata of the files, passed to the workers
+    """
+
+    codes, tickers = pd.factorize(prices["ticker"])
+    tradeday = prices["tradeday"].to_numpy(dtype="datetime64[ns]")
+    arrays = {
+        "tradeday": tradeday.view("int64"),
+        "ticker": codes.astype(np.int32),
+    }
+    for column in PRICE_COLUMNS:
+        arrays[column] = prices[column].to_numpy(dtype=float)
+
+    paths = {}
+    for column, values in arrays.items():
+        paths[column] = os.path.join(folder, column + ".npy")
+        np.save(paths[column], values)
+
+    return {"paths": paths, "tickers": list(tickers)}
+
+
+def _load_prices(store, tickers=None):
+    """Read shared prices back into a DataFrame
+
+    Arguments:
+        store {dict} -- the result of _share_prices
+
+    Keyword Arguments:
+        tickers {list} -- only read the prices of these tickers (default:
+            {None}, all tickers)
+
+    Returns:
+        [DataFrame] -- prices with tradeday, ticker, close, dividend and split
+    """
+
+    arrays = {column: np.load(path, mmap_mode="r")
+              for column, path in store["paths"].items()}
+
+    rows = slice(None)
+    if tickers is not None:
+        wanted = pd.Index(store["tickers"]).get_indexer(list(tickers))
+        rows = np.flatnonzero(np.isin(arrays["ticker"], wanted))
+
+    prices = pd.DataFrame({
+        "tradeday": np.asarray(arrays["tradeday"][rows]).view(
+            "datetime64[ns]"),
+        "ticker": np.asarray(store["tickers"], dtype=object)[
+            arrays["ticker"][rows]],
+    })
+    for column in PRICE_COLUMNS:
+        prices[column] = arrays[column][rows]
+
+    return prices
+
+
+def _run_shard(func, shard, store, shard_by, end_date):
+    """Run a portfolio function on one shard inside a worker process"""
+
+    # Only the prices of the traded tickers are used, so an account shard
+    # does not copy the whole price table either
+    trades = shard["trades"]
+    prices = _load_prices(store, trades["ticker"].unique())
+
+    args = [trades, prices]
+    if func is create_nav:
+        args.append(shard["flows"])
+
+    return func(*args, end_date=end_date, by_account=(shard_by == "account"))
+
+
+def _combine(results):
+    """Combine the results of all shards in the order of the serial run"""
+
+    result = pd.concat(results)
+    if isinstance(result.index, pd.MultiIndex):
+        return result.sort_index()
+
+    order = [column for column in ["account", "tradeday", "type", "ticker"]
+             if column in result]
+    return result.sort_values(by=order).reset_index(drop=True)
@@ -18,8 +18,14 @@ import pandas as pd
 
 from datetime import datetime
 
+from .cache import cached
+from .instrument import instrumented, stage
+from .prices import PriceStore
 
-def create_holdings(trades, splits=None):
+
+@instrumented
+def create_holdings(trades, splits=None, end_date=None, sparse=False,
+                    by_account=False):
     """ Aggregate trade data to create day by date holdings information
 
     Arguments:
@@ -29,6 +35,7 @@ def create_holdings(trades, splits=None):
             - ticker: the name/ticker of the product being traded
             - quantity: number of contracts bought/sold
             - action: whether this is buy/sell
+            - account: the account of the trade, only used with by_account
 
 
 
@@ -38,196 +45,828 @@ def create_holdings(trades, splits=None):
             - tradeday
             - ticker
             - split: the split ratio
+            a PriceStore can be used in place of the DataFrame
+        end_date {str or datetime} -- last day of the holdings (default:
+            {None}, the last day of prices when splits are daily prices
+            with a close column or a PriceStore, otherwise today)
+        sparse {bool} -- return the holdings as SparseHoldings runs instead
+            of one row per day (default: {False})
+        by_account {bool} -- keep the holdings of each account separate
+            instead of combining all trades into one portfolio (default:
+            {False})
 
     Returns:
         [DataFrame] -- holdings data in the following format:
+            - account: only with by_account
             - tradeday
             - ticker
             - quantity: number of contracts held
     """
 
+    # Without prices the holdings end today, which is resolved here so a
+    # cached result is only reused on the day it was computed
+    if end_date is None and not _is_prices(splits):
+        end_date = datetime.now().date()
+
+    return _create_holdings(trades, splits, end_date, sparse, by_account)
+
+
+@cached
+def _create_holdings(trades, splits, end_date, sparse, by_account):
+    """Holdings of create_holdings, with end_date None only for prices"""
+
     trades_use = trades.copy()
+    keys = ["account", "ticker"] if by_account else ["ticker"]
 
     # Set start_date and end_date
     start_date = trades["tradeday"].min().date()
-    end_date = datetime.now().date()
+    if end_date is None:
+        end_date = _last_date(splits)
+    end_date = pd.Timestamp(end_date).date()
 
     # Merge the action and quantity column into 1
     # First combine each day's trading into 1 number by contract,
     # then use the cumulative sum to find out the holdings
-    trades_use["quantity"] = trades_use["quantity"] * \
-        (trades_use["action"].map({"Buy": 1, "Sell": -1}))
-    holdings = trades_use.groupby(["tradeday", "ticker"])["quantity"].sum()
-    holdings = holdings.groupby(["ticker"]).cumsum()
-    holdings = holdings.reset_index()
-
-    # Expand to daily holdings
-    # First expand to wide form and fill each column, then reset index to the
-    # desired date series and gathers back to stacked form
-    holdings = holdings.pivot(index="tradeday", columns="ticker")
-    holdings = holdings.fillna(method="ffill")
-    dates = pd.date_range(start_date, end_date, freq='B')
-    dates.name = "tradeday"
-    holdings = holdings.reindex(dates, method="ffill")
-    holdings = holdings.stack("ticker")
-    holdings = holdings.reset_index()
-
-    # Keep only non-zero holdings dates, in case contracts are sold
-    holdings = holdings[holdings["quantity"] != 0]
+    with stage("create_holdings.cumulate") as current:
+        trades_use["quantity"] = trades_use["quantity"] * \
+            (trades_use["action"].map({"Buy": 1, "Sell": -1}))
+        holdings = trades_use.groupby(keys + ["tradeday"])["quantity"].sum()
+        holdings = holdings.groupby(keys).cumsum()
+        holdings = holdings.reset_index()
+        current.rows = len(holdings)
+
+    # Encode holdings as runs of business days with a constant quantity.
+    # A trade takes effect on the first business day on or after its date,
+    # and a run lasts until the next change of the same ticker
+    with stage("create_holdings.runs") as current:
+        dates = pd.date_range(start_date, end_date, freq='B')
+        dates.name = "tradeday"
+        holdings["start"] = dates.searchsorted(holdings["tradeday"])
+        holdings = holdings.drop_duplicates(keys + ["start"], keep="last")
+        holdings = holdings[holdings["start"] < len(dates)]
+        holdings["end"] = holdings.groupby(keys)["start"].shift(
+            -1, fill_value=len(dates)) - 1
+
+        # Keep only non-zero holdings, in case contracts are sold
+        holdings = holdings[holdings["quantity"] != 0]
+        holdings = holdings[keys + ["start", "end", "quantity"]]
+        holdings["quantity"] = holdings["quantity"].astype(float)
+        current.rows = len(holdings)
 
     if splits is not None:
+        with stage("create_holdings.splits") as current:
+            holdings = _split_runs(holdings, splits, dates, keys)
+            current.rows = len(holdings)
+
+    holdings = holdings.reset_index(drop=True)
+    holdings["start_day"] = dates[holdings["start"]]
+    holdings["end_day"] = dates[holdings["end"]]
+    holdings = SparseHoldings(
+        holdings[keys + ["start_day", "end_day", "quantity"]], dates)
+
+    if sparse:
+        return holdings
+    with stage("create_holdings.expand") as current:
+        holdings = holdings.to_frame()
+        current.rows = len(holdings)
+    return holdings
+
+
+def _split_runs(runs, splits, dates, keys=("ticker",)):
+    """Cut holding runs at split days and apply the split adjustment
 
-        splits_use = splits.copy()
+    Arguments:
+        runs {DataFrame} -- runs with keys, start, end and quantity, where
+            start and end are positions in dates
+        splits {DataFrame} -- split records with tradeday, ticker and split
+        dates {DatetimeIndex} -- business days of the holdings
+
+    Keyword Arguments:
+        keys {list} -- columns identifying a position (default: {("ticker",)})
+
+    Returns:
+        [DataFrame] -- split adjusted runs sorted by keys and start
+    """
 
-        # Merge with splits and add split to holdings
-        splits_use = splits_use[["tradeday", "ticker", "split"]]
-        splits_use = holdings.merge(
-            splits_use, how="left", on=["tradeday", "ticker"])
-        splits_use["split"] = splits_use["split"].fillna(value=1)
+    keys = list(keys)
+
+    # Only splits on held business days change the quantity
+    events = _price_frame(splits)
+    events = events.loc[events["split"].fillna(1) != 1, ["tradeday", "ticker"]]
+    events["start"] = dates.get_indexer(events["tradeday"])
+    events = events[events["start"] >= 0]
+    if keys != ["ticker"]:
+        events = events.merge(runs[keys].drop_duplicates(), on="ticker")
+    events = pd.merge_asof(
+        events[keys + ["start"]].sort_values(by="start"),
+        runs.sort_values(by="start"), on="start", by=keys)
+    events = events[events["start"] <= events["end"]]
+
+    # Each run is cut into segments starting at the run start or a split
+    runs = pd.concat([runs, events], ignore_index=True)
+    runs = runs.drop_duplicates(keys + ["start"])
+    runs = runs.sort_values(by=keys + ["start"]).reset_index(drop=True)
+    next_start = runs.groupby(keys)["start"].shift(-1)
+    runs["end"] = runs["end"].where(
+        ~(next_start <= runs["end"]), next_start - 1).astype(int)
+
+    # Within a segment the raw quantity is constant, so the previous row of
+    # a segment start is the last day of the previous segment and the
+    # adjustment works the same way as on daily holdings
+    segments = runs[keys + ["quantity"]].copy()
+    segments.insert(0, "tradeday", dates[runs["start"]])
+    segments = _adjust_splits(segments, splits, keys=keys)
+    runs["quantity"] = segments["quantity"].values
+
+    return runs
+
+
+def _adjust_splits(holdings, splits, prior=None, keys=("ticker",)):
+    """Apply split ratios to holdings for all tickers in one pass
+
+    Each split adds prev_holding * (split - 1) contracts to the position,
+    where prev_holding is the quantity of the previous holdings row of the
+    same ticker. The adjustments are accumulated with a grouped cumsum and
+    the adjusted quantity is floored to whole contracts.
+
+    Arguments:
+        holdings {DataFrame} -- holdings with tradeday, ticker and quantity
+        splits {DataFrame} -- split records with tradeday, ticker and split
 
-        holdings = pd.DataFrame()
+    Keyword Arguments:
+        prior {DataFrame} -- state carried over from earlier holdings, indexed
+            by ticker with raw_quantity (unadjusted quantity of the last
+            holdings row) and added (cumulative contracts added by splits)
+            columns (default: {None})
+        keys {list} -- columns identifying a position (default: {("ticker",)})
 
-        for _, value in splits_use.groupby("ticker"):
-            value = value.set_index("tradeday")
-            value["prev_holding"] = value["quantity"].shift(1, fill_value=0)
-            value["quantity"] = (value["prev_holding"] * (value["split"] - 1)).cumsum() + value["quantity"]
-            value["quantity"] = value["quantity"].apply(np.floor)
-            value = value.reset_index()
-            holdings = holdings.append(
-                value[["tradeday", "ticker", "quantity"]], ignore_index=True)
+    Returns:
+        [DataFrame] -- split adjusted holdings sorted by keys and tradeday,
+            with the unadjusted quantity in raw_quantity and the cumulative
+            split adjustment in added
+    """
 
+    keys = list(keys)
+    holdings = _merge_prices(
+        holdings[["tradeday"] + keys + ["quantity"]], splits, ["split"])
+    holdings["split"] = holdings["split"].fillna(value=1)
     holdings = holdings.sort_values(
-        by=["tradeday", "ticker"]).reset_index(drop=True)
-    return holdings
+        by=keys + ["tradeday"], kind="mergesort")
+
+    # Contracts added by each split, accumulated per position
+    prev_holding = holdings.groupby(keys)["quantity"].shift(1)
+    first = prev_holding.isna()
+    if prior is not None:
+        prev_holding = prev_holding.fillna(
+            holdings["ticker"].map(prior["raw_quantity"]))
+    prev_holding = prev_holding.fillna(0)
+    added = prev_holding * (holdings["split"] - 1)
+    if prior is not None:
+        added[first] += holdings.loc[first, "ticker"].map(
+            prior["added"]).fillna(0)
+    holdings["added"] = added.groupby(
+        [holdings[key] for key in keys]).cumsum()
+
+    holdings["raw_quantity"] = holdings["quantity"]
+    holdings["quantity"] = np.floor(holdings["quantity"] + holdings["added"])
+
+    return holdings[["tradeday"] + keys + ["quantity", "raw_quantity",
+                                           "added"]]
+
 
+class SparseHoldings(object):
+    """Holdings stored as runs of business days with a constant quantity
 
-def create_pnl(trades, prices):
+    Each run is a (ticker, start_day, end_day, quantity) row, so the memory
+    used grows with the number of position changes rather than with the
+    number of days times tickers. Daily rows are only created on request.
+
+    Arguments:
+        runs {DataFrame} -- runs with ticker, start_day, end_day and quantity,
+            and account if the holdings are kept by account
+        dates {DatetimeIndex} -- business days covered by the holdings
+    """
+
+    def __init__(self, runs, dates):
+        self.runs = runs
+        self.dates = dates
+        self.keys = [key for key in ["account", "ticker"] if key in runs]
+        self.order = self.keys[:-1] + ["tradeday", "ticker"]
+
+    def __len__(self):
+        return len(self.runs)
+
+    def copy(self):
+        """Copy of the holdings, with copies of the runs and dates"""
+
+        return SparseHoldings(self.runs.copy(), self.dates.copy())
+
+    def on(self, date):
+        """Holdings on a single day
+
+        Arguments:
+            date {str or datetime} -- the day to get holdings for
+
+        Returns:
+            [DataFrame] -- holdings with tradeday, ticker and quantity
+        """
+
+        return self.to_frame(date, date)
+
+    def to_frame(self, start_date=None, end_date=None):
+        """Expand the runs into one row per day and ticker
+
+        Keyword Arguments:
+            start_date {str or datetime} -- first day to expand (default:
+                {None}, the first day of the holdings)
+            end_date {str or datetime} -- last day to expand (default:
+                {None}, the last day of the holdings)
+
+        Returns:
+            [DataFrame] -- holdings in the same format as create_holdings
+        """
+
+        first = 0
+        last = len(self.dates) - 1
+        if start_date is not None:
+            first = self.dates.searchsorted(pd.Timestamp(start_date))
+        if end_date is not None:
+            last = self.dates.searchsorted(
+                pd.Timestamp(end_date), side="right") - 1
+
+        runs = self.runs
+        start = np.maximum(self.dates.searchsorted(runs["start_day"]), first)
+        end = np.minimum(self.dates.searchsorted(runs["end_day"]), last)
+        length = np.maximum(end - start + 1, 0)
+
+        # Position of every day of every run in dates
+        offset = np.cumsum(length) - length
+        position = np.arange(length.sum()) + np.repeat(start - offset, length)
+
+        holdings = pd.DataFrame({"tradeday": self.dates[position]})
+        for column in self.keys + ["quantity"]:
+            holdings[column] = np.repeat(runs[column].values, length)
+        holdings = holdings[self.order + ["quantity"]]
+        holdings = holdings.sort_values(by=self.order).reset_index(drop=True)
+
+        return holdings
+
+    def join_prices(self, prices):
+        """Attach the quantity held to price records without expanding the
+        holdings to every day
+
+        Arguments:
+            prices {DataFrame} -- price records with tradeday and ticker, or
+                a PriceStore
+
+        Returns:
+            [DataFrame] -- the price records of held business days, with the
+                quantity held (and account), sorted like create_holdings
+        """
+
+        prices_use = _price_frame(prices)
+        prices_use = prices_use[prices_use["tradeday"].isin(self.dates)]
+        if "account" in self.keys:
+            prices_use = prices_use.merge(
+                self.runs[self.keys].drop_duplicates(), on="ticker")
+        prices_use = prices_use.sort_values(by="tradeday")
+        runs = self.runs.sort_values(by="start_day")
+        runs = runs.astype({"start_day": prices_use["tradeday"].dtype})
+
+        holdings = pd.merge_asof(
+            prices_use, runs, left_on="tradeday", right_on="start_day",
+            by=self.keys)
+        holdings = holdings[holdings["tradeday"] <= holdings["end_day"]]
+        holdings = holdings.drop(columns=["start_day", "end_day"])
+        holdings = holdings.sort_values(by=self.order).reset_index(drop=True)
+
+        return holdings
+
+
+@instrumented
+@cached
+def create_pnl(trades, prices, end_date=None, by_account=False):
     """Create daily portfolio dollar pnl from holdings and trades
 
     Arguments:
         trades {DataFrame} -- Daily trade data
-        prices {DataFrame} -- Daily price data, with dividend and split information
+        prices {DataFrame} -- Daily price data, with dividend and split information,
+            or a PriceStore
+
+    Keyword Arguments:
+        end_date {str or datetime} -- last day of the pnl (default: {None},
+            the last day in prices)
+        by_account {bool} -- compute the pnl of each account separately,
+            indexed by account, tradeday and ticker (default: {False})
     """
 
     trades_use = trades.copy()
-    prices_use = prices.copy()
+    keys = ["account", "ticker"] if by_account else ["ticker"]
 
     # Create Holdings from trades
-    holdings = create_holdings(trades_use, prices_use)
+    holdings = create_holdings(trades_use, prices, end_date,
+                               by_account=by_account)
+    if end_date is not None:
+        trades_use = trades_use[
+            trades_use["tradeday"] <= pd.Timestamp(end_date)]
 
     # Merge holdings and trades with price data
-    holdings = holdings.merge(prices_use, how="left",
-                              on=["tradeday", "ticker"])
-    trades_use = trades_use.merge(
-        prices_use, how="left", on=["tradeday", "ticker"])
+    with stage("create_pnl.merge") as current:
+        holdings = _merge_prices(holdings, prices)
+        trades_use = _merge_prices(trades_use, prices)
+        current.rows = len(holdings) + len(trades_use)
 
     # Calculate pnl from holdings and new trades
-    holdings_pnl = pd.DataFrame()
-    trades_pnl = pd.DataFrame()
-
-    for _, value in holdings.groupby("ticker"):
-        value = value.set_index("tradeday")
-        value["close"] = value["close"].fillna(method="ffill")
-        value["prev_holding"] = value["quantity"].shift(1, fill_value=0)
-        value["price_change"] = value["close"] * value["split"] - value["close"].shift(1)
-        value["pnl"] = value["price_change"] * value["prev_holding"] + \
-            value["dividend"] * value["prev_holding"]
-        value = value.reset_index()
-        holdings_pnl = holdings_pnl.append(
-            value[["tradeday", "ticker", "pnl"]], ignore_index=True)
-
-    for _, value in trades_use.groupby("ticker"):
-        value = value.set_index("tradeday")
-        value["close"] = value["close"].fillna(method="ffill")
-        value["price_change"] = value["close"] - value["price"]
-        value["pnl"] = value["price_change"] * value["quantity"] * \
-            value["action"].map({"Buy": 1, "Sell": -1})
-        value = value.reset_index()
-        trades_pnl = trades_pnl.append(
-            value[["tradeday", "ticker", "pnl"]], ignore_index=True)
+    # All tickers are handled at once with shifts grouped by ticker
+    with stage("create_pnl.pnl") as current:
+        holdings_pnl = _holdings_pnl(holdings, keys)
+        trades_pnl = _trades_pnl(trades_use, keys)
+        current.rows = len(holdings_pnl) + len(trades_pnl)
 
     # Combine pnl into pnl by ticker
-    pnl = holdings_pnl.append(trades_pnl, ignore_index=True)
-    pnl = pnl.groupby(["tradeday", "ticker"]).sum()
+    with stage("create_pnl.combine") as current:
+        pnl = pd.concat([holdings_pnl, trades_pnl], ignore_index=True)
+        pnl = pnl.groupby(keys[:-1] + ["tradeday", "ticker"]).sum()
+        current.rows = len(pnl)
 
     return pnl
 
 
-def create_nav(trades, prices, flows):
+def _holdings_pnl(holdings, keys=("ticker",)):
+    """Compute pnl of positions carried over from the previous day
+
+    Arguments:
+        holdings {DataFrame} -- holdings merged with prices, sorted by tradeday
+
+    Keyword Arguments:
+        keys {list} -- columns identifying a position (default: {("ticker",)})
+
+    Returns:
+        [DataFrame] -- pnl with tradeday, keys and pnl columns
+    """
+
+    keys = list(keys)
+    grouped = holdings.groupby(keys)
+    close = grouped["close"].ffill()
+    prev_close = close.groupby([holdings[key] for key in keys]).shift(1)
+    prev_holding = grouped["quantity"].shift(1, fill_value=0)
+    price_change = close * holdings["split"] - prev_close
+
+    pnl = holdings[["tradeday"] + keys].copy()
+    pnl["pnl"] = price_change * prev_holding + \
+        holdings["dividend"] * prev_holding
+
+    return pnl
+
+
+def _trades_pnl(trades, keys=("ticker",)):
+    """Compute pnl of trades from trade price to the day's close
+
+    Arguments:
+        trades {DataFrame} -- trades merged with prices
+
+    Keyword Arguments:
+        keys {list} -- columns identifying a position (default: {("ticker",)})
+
+    Returns:
+        [DataFrame] -- pnl with tradeday, keys and pnl columns
+    """
+
+    keys = list(keys)
+    close = trades.groupby(keys)["close"].ffill()
+    price_change = close - trades["price"]
+
+    pnl = trades[["tradeday"] + keys].copy()
+    pnl["pnl"] = price_change * trades["quantity"] * \
+        trades["action"].map({"Buy": 1, "Sell": -1})
+
+    return pnl
+
+
+@instrumented
+@cached
+def create_nav(trades, prices, flows, end_date=None, by_account=False):
     """Create dollar nav for each position
 
     Arguments:
         trades {DataFrame} -- Daily trade data
-        prices {DataFrame} -- Daily price data, with dividend and split information
+        prices {DataFrame} -- Daily price data, with dividend and split information,
+            or a PriceStore
         flows {DataFrame} --  Cash flow data of deposit and withdrawl
+
+    Keyword Arguments:
+        end_date {str or datetime} -- last day of the nav (default: {None},
+            the last day in prices)
+        by_account {bool} -- compute the nav of each account separately, with
+            an account column in front (default: {False})
     """
 
     trades_use = trades.copy()
-    prices_use = prices.copy()
     flows_use = flows.copy()
 
-    # Create holdings
-    holdings = create_holdings(trades_use, prices_use)
-    holdings = holdings.merge(prices_use, how="left",
-                              on=["tradeday", "ticker"])
-    holdings["close"] = holdings.groupby(
-        ["ticker"])["close"].fillna(method="ffill")
+    # Without by_account all trades and flows belong to one portfolio
+    if not by_account:
+        trades_use["account"] = ""
+        flows_use["account"] = ""
+
+    # Create holdings, from the caller's trades so the call shares its
+    # cached result with create_holdings and create_pnl
+    holdings = create_holdings(trades, prices, end_date,
+                               by_account=by_account)
+    if not by_account:
+        holdings.insert(0, "account", "")
+    with stage("create_nav.merge") as current:
+        holdings = _merge_prices(holdings, prices)
+        holdings["close"] = holdings.groupby(
+            ["account", "ticker"])["close"].ffill()
+        current.rows = len(holdings)
 
     # Start date of nav is the first day of flows
     # End date of nav is the last day we have holdings
-    start_date = flows_use["tradeday"].min().date()
-    end_date = holdings["tradeday"].max().date()
-
-    # Create empty dataframe of dates for merging with
-    # nav data later
-    dates = pd.date_range(start_date, end_date, freq='B')
-    dates.name = "tradeday"
+    with stage("create_nav.days") as current:
+        bounds = pd.DataFrame({
+            "start": flows_use.groupby("account")["tradeday"].min(),
+            "end": holdings.groupby("account")["tradeday"].max(),
+        }).dropna()
+
+        # Create dataframe of business days of each account for merging
+        # with nav data later
+        dates = pd.date_range(bounds["start"].min().date(),
+                              bounds["end"].max().date(), freq='B')
+        dates.name = "tradeday"
+        days = pd.MultiIndex.from_product(
+            [bounds.index, dates], names=["account", "tradeday"])
+        days = days.to_frame(index=False).merge(
+            bounds, left_on="account", right_index=True)
+        days = days[days["tradeday"].between(
+            days["start"].dt.normalize(), days["end"])]
+        days = days[["account", "tradeday"]].sort_values(
+            by="tradeday", kind="mergesort").reset_index(drop=True)
+        current.rows = len(days)
 
     # Create daily cumulative cashflow resulted from
     # deposit and withdrawal
-    cash = flows_use[["tradeday", "amount"]]
-    cash = cash.groupby(["tradeday"]).sum()
-    cash["nav"] = cash["amount"].cumsum()
-    cash = cash["nav"]
-    cash = cash.reindex(dates, method="ffill")
+    with stage("create_nav.flows") as current:
+        cash = flows_use.groupby(["account", "tradeday"])["amount"].sum()
+        cash = _balance_on(days, cash.groupby("account").cumsum())
+        current.rows = len(flows_use)
 
     # Create daily cumulative dividend payout information
-    dividend = pd.DataFrame()
-    for _, value in holdings.groupby("ticker"):
-        value = value.set_index("tradeday")
-        value["prev_holding"] = value["quantity"].shift(1, fill_value=0)
-        value["nav"] = value["dividend"] * value["prev_holding"]
-        value = value.reset_index()
-        dividend = dividend.append(
-            value[["tradeday", "nav"]], ignore_index=True)
-    dividend = dividend.groupby(["tradeday"]).sum()
-    dividend["nav"] = dividend["nav"].cumsum()
-    dividend = dividend.reindex(dates, method="ffill")
+    with stage("create_nav.dividends") as current:
+        dividend = _dividend_ledger(holdings, ["account", "ticker"])
+        dividend = dividend.groupby(["account", "tradeday"])[
+            "dividend_cash"].sum()
+        dividend = _balance_on(days, dividend.groupby("account").cumsum())
+        current.rows = len(dividend)
 
     # Create daily cumulative cashflow resulted from trading
-    trades_use["nav"] = -trades_use["price"] * trades_use["quantity"] * \
-        trades_use["action"].map({"Buy": 1, "Sell": -1})
-    trades_use = trades_use.groupby(["tradeday"]).sum()
-    trades_use["nav"] = trades_use["nav"].cumsum()
-    trades_use = trades_use.reindex(dates, method="ffill")
+    with stage("create_nav.trades") as current:
+        current.rows = len(trades_use)
+        trades_use["nav"] = -trades_use["price"] * trades_use["quantity"] * \
+            trades_use["action"].map({"Buy": 1, "Sell": -1})
+        trades_use = trades_use.groupby(["account", "tradeday"])["nav"].sum()
+        trades_use = _balance_on(days, trades_use.groupby("account").cumsum())
 
     # Combine cumulative cashflows from deposit, withdrawl, dividends and
     # trading together into daily cash balances
-    cash = cash.add(trades_use["nav"], fill_value=0).add(
-        dividend["nav"], fill_value=0)
-    cash = cash.reset_index()
+    cash = days.assign(nav=cash + trades_use.fillna(0) + dividend.fillna(0))
     cash["type"] = "cash"
     cash["ticker"] = ""
-    cash = cash[["tradeday", "type", "ticker", "nav"]]
+    cash = cash[["account", "tradeday", "type", "ticker", "nav"]]
 
     # Create market to market daily holdings' nav
-    holdings["nav"] = holdings.groupby(["tradeday", "ticker"], group_keys=False).apply(
-        lambda x: x["quantity"] * x["close"])
-    holdings["type"] = "equity"
-    holdings = holdings[["tradeday", "type", "ticker", "nav"]]
+    with stage("create_nav.market_value") as current:
+        holdings["nav"] = holdings["quantity"] * holdings["close"]
+        holdings["type"] = "equity"
+        holdings = holdings[["account", "tradeday", "type", "ticker", "nav"]]
+        current.rows = len(holdings)
 
     # Combine cash balances with holding balances
-    nav = cash.append(holdings, ignore_index=True).sort_values(
-        by=["tradeday", "type", "ticker"]).reset_index(drop=True)
+    with stage("create_nav.sort") as current:
+        nav = pd.concat([cash, holdings], ignore_index=True).sort_values(
+            by=["account", "tradeday", "type", "ticker"]).reset_index(
+                drop=True)
+        current.rows = len(nav)
+
+    if not by_account:
+        nav = nav.drop(columns="account")
 
     return nav
+
+
+@instrumented
+@cached
+def create_dividends(trades, prices, end_date=None, by_account=False):
+    """Create the dividend cash paid to each position on each day
+
+    The dividends are the same create_nav adds to cash, without computing
+    the nav.
+
+    Arguments:
+        trades {DataFrame} -- Daily trade data
+        prices {DataFrame} -- Daily price data, with dividend and split information,
+            or a PriceStore
+
+    Keyword Arguments:
+        end_date {str or datetime} -- last day of the dividends (default:
+            {None}, the last day in prices)
+        by_account {bool} -- keep the dividends of each account separate,
+            with an account column in front (default: {False})
+
+    Returns:
+        [DataFrame] -- one row per dividend paid, sorted like
+            create_holdings:
+            - account: only with by_account
+            - tradeday
+            - ticker
+            - quantity: number of contracts the dividend is paid on, held
+                at the end of the previous day
+            - dividend: dividend per contract
+            - dividend_cash: dividend paid
+    """
+
+    keys = ["account", "ticker"] if by_account else ["ticker"]
+
+    holdings = create_holdings(trades, prices, end_date,
+                               by_account=by_account)
+    with stage("create_dividends.merge") as current:
+        holdings = _merge_prices(holdings, prices, ["dividend"])
+        current.rows = len(holdings)
+
+    with stage("create_dividends.ledger") as current:
+        ledger = _dividend_ledger(holdings, keys)
+        current.rows = len(ledger)
+
+    return ledger
+
+
+def _dividend_ledger(holdings, keys=("ticker",)):
+    """Dividend cash of every position in one grouped pass
+
+    Arguments:
+        holdings {DataFrame} -- holdings merged with prices, sorted by tradeday
+
+    Keyword Arguments:
+        keys {list} -- columns identifying a position (default: {("ticker",)})
+
+    Returns:
+        [DataFrame] -- the rows of holdings with a dividend, with tradeday,
+            keys, quantity, dividend and dividend_cash columns
+    """
+
+    keys = list(keys)
+    prev_holding = holdings.groupby(keys)["quantity"].shift(1, fill_value=0)
+    dividend_cash = holdings["dividend"] * prev_holding
+    paid = dividend_cash.fillna(0).to_numpy() != 0
+
+    ledger = holdings.loc[paid, keys[:-1] + ["tradeday", "ticker"]]
+    ledger["quantity"] = prev_holding[paid]
+    ledger["dividend"] = holdings.loc[paid, "dividend"]
+    ledger["dividend_cash"] = dividend_cash[paid]
+
+    return ledger.reset_index(drop=True)
+
+
+def _merge_prices(frame, prices, columns=None):
+    """Left merge price columns onto records by tradeday and ticker
+
+    Arguments:
+        frame {DataFrame} -- records with tradeday and ticker
+        prices {DataFrame} -- Daily price data, or a PriceStore
+
+    Keyword Arguments:
+        columns {list} -- price columns to merge (default: {None}, all)
+
+    Returns:
+        [DataFrame] -- frame with the price columns added
+    """
+
+    if isinstance(prices, PriceStore):
+        return prices.merge(frame, columns)
+    if columns is not None:
+        prices = prices[["tradeday", "ticker"] + list(columns)]
+    return frame.merge(prices, how="left", on=["tradeday", "ticker"])
+
+
+def _price_frame(prices):
+    """Price data as a DataFrame, from a DataFrame or a PriceStore"""
+    if isinstance(prices, PriceStore):
+        return prices.frame
+    return prices
+
+
+def _is_prices(prices):
+    """Whether data is daily prices rather than a table of splits only"""
+    if isinstance(prices, PriceStore):
+        return True
+    return prices is not None and "close" in prices
+
+
+def _last_date(prices):
+    """Last tradeday of price data, from a DataFrame or a PriceStore"""
+    if isinstance(prices, PriceStore):
+        return prices.last_date
+    return prices["tradeday"].max()
+
+
+def _balance_on(days, balance):
+    """Look up the latest cumulative balance of each account on each day
+
+    Arguments:
+        days {DataFrame} -- account and tradeday columns, sorted by tradeday
+        balance {Series} -- cumulative balances indexed by account and tradeday
+
+    Returns:
+        [Series] -- balance of each row of days, nan before the first balance
+    """
+
+    balance = balance.rename("balance").reset_index()
+    balance = balance.astype({"tradeday": days["tradeday"].dtype})
+    balance = pd.merge_asof(days, balance.sort_values(by="tradeday"),
+                            on="tradeday", by="account")
+
+    return balance["balance"]
+
+
+class NavBuilder(object):
+    """Build dollar nav incrementally, one batch of new days at a time
+
+    The builder keeps the state needed to extend nav without the history:
+    the quantity, split adjustment and last close of each ticker, and the
+    cumulative deposits/withdrawals, trading cash and dividends. Each call
+    to update only looks at the new trades, prices and flows, and returns
+    the same rows create_nav would return for those days.
+
+    Example:
+        builder = NavBuilder()
+        nav = builder.update(trades, prices, flows)
+        new_nav = builder.update(new_trades, new_prices, new_flows)
+    """
+
+    def __init__(self):
+        self.last_date = None
+        self.positions = pd.DataFrame(
+            columns=["position", "raw_quantity", "added", "quantity",
+                     "close"],
+            index=pd.Index([], name="ticker"), dtype=float)
+        self.flows = np.nan
+        self.trades = 0.0
+        self.dividend = 0.0
+
+    def update(self, trades, prices, flows, end_date=None):
+        """Extend nav with a batch of new data
+
+        Arguments:
+            trades {DataFrame} -- trades after the last update
+            prices {DataFrame} -- prices of the new days, with dividend and
+                split information
+            flows {DataFrame} -- cash flows after the last update
+
+        Keyword Arguments:
+            end_date {str or datetime} -- last day to build nav for
+                (default: {None}, the last day in prices)
+
+        Returns:
+            [DataFrame] -- nav of the new days, in the same format as
+                create_nav, empty until the first trade or flow
+        """
+
+        if end_date is None:
+            end_date = prices["tradeday"].max()
+        end_date = pd.Timestamp(end_date)
+
+        # Nothing to build before the first trade or flow, or without any
+        # day to build for
+        if pd.isnull(end_date):
+            if len(trades) or len(flows):
+                raise ValueError("end_date is required when prices are empty")
+            return _empty_nav()
+        if self.last_date is None and not len(trades) and not len(flows):
+            return _empty_nav()
+
+        for name, data in [("trades", trades), ("flows", flows)]:
+            if self.last_date is not None and \
+                    (data["tradeday"] <= self.last_date).any():
+                raise ValueError(
+                    "{} must be after the last update on {}".format(
+                        name, self.last_date.date()))
+            if (data["tradeday"] > end_date).any():
+                raise ValueError("{} must not be after {}".format(
+                    name, end_date.date()))
+
+        if self.last_date is None:
+            start_date = pd.concat(
+                [trades["tradeday"], flows["tradeday"]]).min()
+            anchor = start_date - pd.Timedelta(days=1)
+        else:
+            start_date = self.last_date + pd.Timedelta(days=1)
+            anchor = self.last_date
+        dates = pd.date_range(start_date.date(), end_date.date(), freq='B')
+        dates.name = "tradeday"
+
+        holdings = self._holdings(trades, prices, dates, anchor)
+
+        # Cumulative deposits/withdrawals, trading cash and dividends,
+        # continued from the previous state
+        trades_use = trades.copy()
+        trades_use["nav"] = -trades_use["price"] * trades_use["quantity"] * \
+            trades_use["action"].map({"Buy": 1, "Sell": -1})
+        trades_use = trades_use.groupby(["tradeday"])["nav"].sum()
+        flows_use = flows.groupby(["tradeday"])["amount"].sum()
+        dividend = holdings.groupby(["tradeday"])["dividend_cash"].sum()
+
+        self.flows, flows_use = _carry(flows_use, self.flows, anchor, dates)
+        self.trades, trades_use = _carry(
+            trades_use, self.trades, anchor, dates)
+        self.dividend, dividend = _carry(
+            dividend, self.dividend, anchor, dates)
+
+        cash = flows_use.add(trades_use, fill_value=0).add(
+            dividend, fill_value=0)
+        cash = cash[flows_use.notna()]
+        cash = cash.rename("nav").reset_index()
+        cash["type"] = "cash"
+        cash["ticker"] = ""
+        cash = cash[["tradeday", "type", "ticker", "nav"]]
+
+        holdings["nav"] = holdings["quantity"] * holdings["close"]
+        holdings["type"] = "equity"
+        holdings = holdings[["tradeday", "type", "ticker", "nav"]]
+
+        self.last_date = end_date
+
+        nav = pd.concat([cash, holdings], ignore_index=True).sort_values(
+            by=["tradeday", "type", "ticker"]).reset_index(drop=True)
+
+        return nav
+
+    def _holdings(self, trades, prices, dates, anchor):
+        """Create split adjusted holdings of the new days and update the
+        position state"""
+
+        positions = self.positions
+
+        # Cumulative quantity by ticker, starting from the current position
+        trades_use = trades.copy()
+        trades_use["quantity"] = trades_use["quantity"] * \
+            (trades_use["action"].map({"Buy": 1, "Sell": -1}))
+        quantity = trades_use.groupby(["tradeday", "ticker"])[
+            "quantity"].sum().unstack("ticker")
+        position = pd.DataFrame(
+            [positions["position"].values], columns=positions.index,
+            index=pd.DatetimeIndex([anchor], name="tradeday"))
+        quantity = pd.concat([position, quantity])
+        quantity = quantity.fillna(0).cumsum()
+        quantity.columns.name = "ticker"
+        positions = positions.reindex(quantity.columns)
+        positions["position"] = quantity.iloc[-1]
+
+        # Expand to the new days and keep the non-zero holdings
+        holdings = quantity.reindex(dates, method="ffill")
+        holdings = holdings.stack().rename("quantity").reset_index()
+        holdings = holdings[holdings["quantity"] != 0]
+
+        holdings = _adjust_splits(holdings, prices, prior=positions)
+        holdings = holdings.merge(
+            prices[["tradeday", "ticker", "close", "dividend"]],
+            how="left", on=["tradeday", "ticker"])
+
+        grouped = holdings.groupby("ticker")
+        holdings["close"] = grouped["close"].ffill().fillna(
+            holdings["ticker"].map(positions["close"]))
+        prev_holding = grouped["quantity"].shift(1).fillna(
+            holdings["ticker"].map(positions["quantity"])).fillna(0)
+        holdings["dividend_cash"] = holdings["dividend"] * prev_holding
+
+        last = holdings.groupby("ticker").last()
+        for column in ["raw_quantity", "added", "quantity", "close"]:
+            positions.loc[last.index, column] = last[column]
+        self.positions = positions
+
+        return holdings
+
+
+def _empty_nav():
+    """Nav without rows, in the format of NavBuilder.update"""
+    return pd.DataFrame({"tradeday": pd.Series([], dtype="datetime64[ns]"),
+                         "type": pd.Series([], dtype=object),
+                         "ticker": pd.Series([], dtype=object),
+                         "nav": pd.Series([], dtype=float)})
+
+
+def _carry(daily, initial, anchor, dates):
+    """Cumulate daily amounts from an initial balance onto business days
+
+    Arguments:
+        daily {Series} -- daily amounts indexed by tradeday
+        initial {float} -- balance before the first day, nan if none
+        anchor {datetime} -- date of the initial balance, before all days
+        dates {DatetimeIndex} -- business days to report balances for
+
+    Returns:
+        [tuple] -- the final balance and the balances on dates
+    """
+
+    balance = pd.concat([pd.Series([initial], index=[anchor]), daily])
+    balance = balance.cumsum()
+    return balance.iloc[-1], balance.reindex(dates, method="ffill")
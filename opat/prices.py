@@ -0,0 +1,168 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pandas as pd
+
+# Price columns used by the portfolio functions
+PRICE_COLUMNS = ("close", "dividend", "split")
+
+
+class PriceStore(object):
+    """Daily prices indexed by ticker and tradeday for repeated lookups
+
+    The prices are sorted once by (ticker, tradeday) into a single int64
+    key, so each lookup is a binary search instead of a hash join of the
+    whole price table. A PriceStore can be passed to create_holdings,
+    create_pnl and create_nav in place of the prices DataFrame.
+
+    Arguments:
+        prices {DataFrame} -- Daily price data with tradeday and ticker
+
+    Keyword Arguments:
+        columns {list} -- price columns to keep (default: {PRICE_COLUMNS})
+    """
+
+    def __init__(self, prices, columns=PRICE_COLUMNS):
+        self.columns = list(columns)
+
+        codes, tickers = pd.factorize(prices["ticker"], sort=True)
+        days = _day_number(prices["tradeday"])
+        keys = _key(codes, days)
+
+        # Sort by ticker and day, keeping the last row of duplicates
+        order = np.argsort(keys, kind="mergesort")
+        keys = keys[order]
+        last = np.append(keys[1:] != keys[:-1], True)
+        order = order[last]
+
+        self.tickers = tickers
+        self.keys = keys[last]
+        self.starts = np.searchsorted(codes[order], np.arange(len(tickers)))
+        self.tradeday = prices["tradeday"].to_numpy()[order]
+        self.values = {column: prices[column].to_numpy(dtype=float)[order]
+                       for column in self.columns}
+        self._frame = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def last_date(self):
+        """The last tradeday with a price"""
+        return pd.Timestamp(self.tradeday.max())
+
+    @property
+    def frame(self):
+        """The stored prices as a DataFrame sorted by ticker and tradeday"""
+        if self._frame is None:
+            codes = np.searchsorted(self.starts, np.arange(len(self)),
+                                    side="right") - 1
+            frame = pd.DataFrame({"tradeday": self.tradeday,
+                                  "ticker": self.tickers[codes]})
+            for column in self.columns:
+                frame[column] = self.values[column]
+            self._frame = frame
+        return self._frame
+
+    def _positions(self, tradeday, ticker, asof):
+        """Find the row of each (tradeday, ticker) pair, -1 if missing"""
+        codes = self.tickers.get_indexer(ticker)
+        keys = _key(codes, _day_number(tradeday))
+        positions = np.searchsorted(self.keys, keys, side="right") - 1
+
+        starts = self.starts[np.maximum(codes, 0)]
+        found = (codes >= 0) & (positions >= starts)
+        if not asof:
+            found &= self.keys[np.maximum(positions, 0)] == keys
+        return np.where(found, positions, -1)
+
+    def lookup(self, tradeday, ticker, columns=None, asof=False):
+        """Look up prices of (tradeday, ticker) pairs
+
+        Arguments:
+            tradeday {array-like} -- days to look up
+            ticker {array-like} -- tickers to look up
+
+        Keyword Arguments:
+            columns {list} -- price columns to return (default: {None}, all)
+            asof {bool} -- use the last price on or before tradeday when
+                there is none on tradeday (default: {False})
+
+        Returns:
+            [DataFrame] -- one row per pair, nan where there is no price
+        """
+
+        if columns is None:
+            columns = self.columns
+        positions = self._positions(tradeday, ticker, asof)
+        found = positions >= 0
+
+        result = {}
+        for column in columns:
+            values = self.values[column][np.maximum(positions, 0)]
+            result[column] = np.where(found, values, np.nan)
+
+        return pd.DataFrame(result, columns=columns)
+
+    def asof(self, tradeday, ticker, columns=None):
+        """Look up the last prices on or before each tradeday
+
+        Arguments:
+            tradeday {array-like} -- days to look up
+            ticker {array-like} -- tickers to look up
+
+        Keyword Arguments:
+            columns {list} -- price columns to return (default: {None}, all)
+
+        Returns:
+            [DataFrame] -- one row per pair, nan before the first price
+        """
+
+        return self.lookup(tradeday, ticker, columns, asof=True)
+
+    def merge(self, frame, columns=None):
+        """Add price columns to a frame with tradeday and ticker columns
+
+        This gives the same result as a left merge of frame with the prices
+        on tradeday and ticker.
+
+        Arguments:
+            frame {DataFrame} -- records with tradeday and ticker
+
+        Keyword Arguments:
+            columns {list} -- price columns to add (default: {None}, all)
+
+        Returns:
+            [DataFrame] -- a copy of frame with the price columns added
+        """
+
+        prices = self.lookup(frame["tradeday"], frame["ticker"], columns)
+        result = frame.copy()
+        for column in prices:
+            result[column] = prices[column].values
+
+        return result
+
+
+def _day_number(tradeday):
+    """Number of days since 1970-01-01 of each tradeday"""
+    return pd.DatetimeIndex(tradeday).to_numpy(
+        dtype="datetime64[D]").astype(np.int64)
+
+
+def _key(codes, days):
+    """Combine ticker codes and day numbers into one sortable key"""
+    return (np.asarray(codes, dtype=np.int64) << 32) + days
@@ -0,0 +1,177 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+from .drawdown import _drawdowns
+from .stats import _annualize, _total_log_growth, _total_signs, _values
+
+RATIOS = ("sharpe", "sortino", "calmar", "omega", "information")
+
+
+class _Intermediates(object):
+    """
+    Statistics shared by the ratios, each computed at most once
+
+    Parameters
+    ----------
+    returns : pd.DataFrame of returns
+    years : float, length of the sample in years
+    risk_free : float, annualized risk free rate
+    required_return : float, annualized minimum acceptable return
+    benchmark : np.ndarray of benchmark returns, or None
+    """
+
+    def __init__(self, returns, years, risk_free, required_return,
+                 benchmark=None):
+        self.returns = returns
+        self.values = _values(returns)
+        self.years = years
+        self.risk_free = risk_free
+        self.required_return = required_return
+        self.benchmark = benchmark
+        self.cache = {}
+
+    def get(self, name):
+        """The intermediate called name, computing it on first use"""
+        if name not in self.cache:
+            self.cache[name] = getattr(self, "_" + name)()
+        return self.cache[name]
+
+    def _count(self):
+        return np.count_nonzero(~np.isnan(self.values), axis=0)
+
+    def _periods_per_year(self):
+        return self.get("count") / self.years
+
+    def _annualized_return(self):
+        return _annualize(_total_log_growth(self.values), self.years,
+                          _total_signs(self.values))
+
+    def _annualized_std(self):
+        std = np.nanstd(self.values, axis=0, ddof=1)
+        return std * np.sqrt(self.get("periods_per_year"))
+
+    def _threshold(self):
+        # Per period equivalent of the required return
+        growth = np.log1p(self.required_return)
+        return np.expm1(growth / self.get("periods_per_year"))
+
+    def _shortfall(self):
+        return np.fmax(self.get("threshold") - self.values, 0)
+
+    def _downside_deviation(self):
+        shortfall = self.get("shortfall")
+        mean = np.nansum(shortfall ** 2, axis=0) / self.get("count")
+        return np.sqrt(mean * self.get("periods_per_year"))
+
+    def _max_drawdown(self):
+        return _drawdowns(self.returns)[0].min(axis=0)
+
+    def _active(self):
+        if self.benchmark is None:
+            raise ValueError("The information ratio requires a benchmark")
+        return self.values - self.benchmark[:, None]
+
+    def _tracking_error(self):
+        std = np.nanstd(self.get("active"), axis=0, ddof=1)
+        return std * np.sqrt(self.get("periods_per_year"))
+
+    def _sharpe(self):
+        excess = self.get("annualized_return") - self.risk_free
+        return excess / self.get("annualized_std")
+
+    def _sortino(self):
+        excess = self.get("annualized_return") - self.required_return
+        return excess / self.get("downside_deviation")
+
+    def _calmar(self):
+        return self.get("annualized_return") / -self.get("max_drawdown")
+
+    def _omega(self):
+        excess = np.fmax(self.values - self.get("threshold"), 0)
+        shortfall = np.nansum(self.get("shortfall"), axis=0)
+        return np.nansum(excess, axis=0) / shortfall
+
+    def _information(self):
+        active = np.nanmean(self.get("active"), axis=0)
+        active = active * self.get("periods_per_year")
+        return active / self.get("tracking_error")
+
+
+def ratios(returns, benchmark=None, risk_free=0, required_return=0,
+           names=RATIOS, start_date=None, end_date=None):
+    """
+    Compute risk adjusted ratios of periodic returns in one summary frame
+
+    Intermediates shared by the ratios, like the annualized return, the
+    downside deviation, the drawdown and the number of periods per year, are
+    each computed once per call and only when a requested ratio needs them.
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of returns
+    benchmark : str or pd.Series, optional
+        Column of returns, or a series of benchmark returns on the same
+        dates, for the information ratio
+    risk_free : float, optional
+        Annualized risk free rate, for the Sharpe ratio
+    required_return : float, optional
+        Annualized minimum acceptable return, for the Sortino and Omega
+        ratios
+    names : list, optional
+        Ratios to compute, any of sharpe, sortino, calmar, omega and
+        information. Defaults to all of them, without information when there
+        is no benchmark.
+    start_date end_date : string in %Y-%m-%d. Defaults to None. If given,
+    used as the start or end of the sample when annualizing, as in
+    annualized_return.
+
+    Returns
+    -------
+    ratios : pd.DataFrame
+        One row per series and one column per ratio.
+    """
+    if isinstance(returns, pd.Series):
+        returns = returns.to_frame()
+    if names is RATIOS and benchmark is None:
+        names = [name for name in RATIOS if name != "information"]
+    unknown = set(names) - set(RATIOS)
+    if unknown:
+        raise ValueError("Unknown ratios: {}".format(sorted(unknown)))
+
+    if start_date is None:
+        start_date = returns.index[0]
+    else:
+        start_date = datetime.strptime(start_date, "%Y-%m-%d")
+    if end_date is None:
+        end_date = returns.index[-1]
+    else:
+        end_date = datetime.strptime(end_date, "%Y-%m-%d")
+    diff_in_years = ((end_date - start_date).total_seconds() / timedelta(days=365.25).total_seconds())
+
+    if isinstance(benchmark, str):
+        benchmark = returns[benchmark]
+    if benchmark is not None:
+        benchmark = benchmark.reindex(returns.index).to_numpy(dtype=float)
+
+    intermediates = _Intermediates(returns, diff_in_years,
+                                   risk_free, required_return, benchmark)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = {name: intermediates.get(name) for name in names}
+
+    return pd.DataFrame(result, index=returns.columns, columns=list(names))
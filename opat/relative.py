@@ -0,0 +1,262 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+
+from .stats import _values
+
+STATISTICS = ("beta", "alpha", "correlation", "tracking_error",
+              "up_capture", "down_capture")
+
+
+def _frame(returns, benchmarks):
+    """The funds and benchmarks as frames on the same dates"""
+    if isinstance(returns, pd.Series):
+        returns = returns.to_frame()
+    if isinstance(benchmarks, str):
+        benchmarks = [benchmarks]
+    if isinstance(benchmarks, list):
+        benchmarks = returns[benchmarks]
+    if isinstance(benchmarks, pd.Series):
+        benchmarks = benchmarks.to_frame()
+
+    return returns, benchmarks.reindex(returns.index)
+
+
+class _Moments(object):
+    """
+    Pairwise sums of every fund against every benchmark
+
+    Each sum over the dates where both the fund and the benchmark have a
+    return is one matrix product of the (dates x funds) and (dates x
+    benchmarks) matrices, with missing returns as 0 and masks of the valid
+    returns. The returns are centered on their column means first, which
+    does not change the covariances but keeps the sums small.
+
+    Parameters
+    ----------
+    returns : pd.DataFrame of fund returns
+    benchmarks : pd.DataFrame of benchmark returns on the same dates
+    """
+
+    def __init__(self, returns, benchmarks):
+        funds = _values(returns)
+        bench = _values(benchmarks)
+        fund_valid = (~np.isnan(funds)).astype(float)
+        bench_valid = (~np.isnan(bench)).astype(float)
+
+        self.fund_center = np.nanmean(funds, axis=0)
+        self.bench_center = np.nanmean(bench, axis=0)
+        x = np.nan_to_num(funds - self.fund_center)
+        y = np.nan_to_num(bench - self.bench_center)
+
+        # (funds x benchmarks) sums over the dates valid for both
+        self.count = fund_valid.T @ bench_valid
+        self.sum_x = x.T @ bench_valid
+        self.sum_y = fund_valid.T @ y
+        self.sum_xy = x.T @ y
+        self.sum_xx = (x * x).T @ bench_valid
+        self.sum_yy = fund_valid.T @ (y * y)
+
+        # Sums of the raw returns over the dates the benchmark was up or down
+        raw_x = np.nan_to_num(funds)
+        raw_y = np.nan_to_num(bench)
+        up = bench_valid * (raw_y > 0)
+        down = bench_valid * (raw_y < 0)
+        self.up_x = raw_x.T @ up
+        self.up_y = fund_valid.T @ (raw_y * up)
+        self.down_x = raw_x.T @ down
+        self.down_y = fund_valid.T @ (raw_y * down)
+
+        dates = returns.index
+        year = timedelta(days=365.25).total_seconds()
+        self.years = (dates[-1] - dates[0]).total_seconds() / year
+
+    def covariance(self):
+        return (self.sum_xy - self.sum_x * self.sum_y / self.count) / \
+            (self.count - 1)
+
+    def fund_variance(self):
+        return (self.sum_xx - self.sum_x ** 2 / self.count) / (self.count - 1)
+
+    def bench_variance(self):
+        return (self.sum_yy - self.sum_y ** 2 / self.count) / (self.count - 1)
+
+    def periods_per_year(self):
+        return self.count / self.years
+
+    def beta(self):
+        return self.covariance() / self.bench_variance()
+
+    def alpha(self):
+        fund_mean = self.fund_center[:, None] + self.sum_x / self.count
+        bench_mean = self.bench_center[None, :] + self.sum_y / self.count
+        excess = fund_mean - self.beta() * bench_mean
+        return excess * self.periods_per_year()
+
+    def correlation(self):
+        variance = self.fund_variance() * self.bench_variance()
+        return self.covariance() / np.sqrt(variance)
+
+    def tracking_error(self):
+        variance = self.fund_variance() + self.bench_variance() - \
+            2 * self.covariance()
+        return np.sqrt(np.maximum(variance, 0) * self.periods_per_year())
+
+    def up_capture(self):
+        return self.up_x / self.up_y
+
+    def down_capture(self):
+        return self.down_x / self.down_y
+
+
+def _statistic(name, returns, benchmarks):
+    """One statistic of every fund against every benchmark as a frame"""
+    return relative_stats(returns, benchmarks, names=[name])[name]
+
+
+def beta(returns, benchmarks):
+    """
+    Compute the beta of each fund to each benchmark
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of fund returns
+    benchmarks : pd.Series or pd.DataFrame of benchmark returns on the same
+        dates, or the names of benchmark columns of returns
+
+    Returns
+    -------
+    beta : pd.DataFrame
+        One row per fund and one column per benchmark.
+    """
+    return _statistic("beta", returns, benchmarks)
+
+
+def alpha(returns, benchmarks):
+    """
+    Compute the annualized alpha of each fund against each benchmark, the
+    mean return not explained by beta
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of fund returns
+    benchmarks : pd.Series or pd.DataFrame of benchmark returns on the same
+        dates, or the names of benchmark columns of returns
+
+    Returns
+    -------
+    alpha : pd.DataFrame
+        One row per fund and one column per benchmark.
+    """
+    return _statistic("alpha", returns, benchmarks)
+
+
+def correlation(returns, benchmarks):
+    """
+    Compute the correlation of each fund with each benchmark
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of fund returns
+    benchmarks : pd.Series or pd.DataFrame of benchmark returns on the same
+        dates, or the names of benchmark columns of returns
+
+    Returns
+    -------
+    correlation : pd.DataFrame
+        One row per fund and one column per benchmark.
+    """
+    return _statistic("correlation", returns, benchmarks)
+
+
+def tracking_error(returns, benchmarks):
+    """
+    Compute the annualized tracking error, the standard deviation of the
+    difference between each fund and each benchmark
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of fund returns
+    benchmarks : pd.Series or pd.DataFrame of benchmark returns on the same
+        dates, or the names of benchmark columns of returns
+
+    Returns
+    -------
+    tracking_error : pd.DataFrame
+        One row per fund and one column per benchmark.
+    """
+    return _statistic("tracking_error", returns, benchmarks)
+
+
+def capture(returns, benchmarks):
+    """
+    Compute the up and down capture ratios, the mean fund return over the
+    mean benchmark return in the periods the benchmark was up or down
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of fund returns
+    benchmarks : pd.Series or pd.DataFrame of benchmark returns on the same
+        dates, or the names of benchmark columns of returns
+
+    Returns
+    -------
+    capture : pd.DataFrame
+        Columns (up_capture, benchmark) and (down_capture, benchmark), one
+        row per fund.
+    """
+    return relative_stats(returns, benchmarks,
+                          names=["up_capture", "down_capture"])
+
+
+def relative_stats(returns, benchmarks, names=STATISTICS):
+    """
+    Compute benchmark relative statistics of N funds against M benchmarks
+
+    All statistics come from the same pairwise sums, which are computed
+    once with matrix products, so no fund and benchmark pair is handled on
+    its own.
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of fund returns
+    benchmarks : pd.Series or pd.DataFrame of benchmark returns on the same
+        dates, or the names of benchmark columns of returns
+    names : list, optional
+        Statistics to compute, any of beta, alpha, correlation,
+        tracking_error, up_capture and down_capture. Defaults to all.
+
+    Returns
+    -------
+    stats : pd.DataFrame
+        Columns are (statistic, benchmark) pairs, one row per fund.
+    """
+    unknown = set(names) - set(STATISTICS)
+    if unknown:
+        raise ValueError("Unknown statistics: {}".format(sorted(unknown)))
+
+    returns, benchmarks = _frame(returns, benchmarks)
+    moments = _Moments(returns, benchmarks)
+    result = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for name in names:
+            result[name] = pd.DataFrame(getattr(moments, name)(),
+                                        index=returns.columns,
+                                        columns=benchmarks.columns)
+
+    return pd.concat(result, axis=1)
@@ -0,0 +1,198 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+
+from .stats import (_annualize, _growth_signs, _log_growth, _stack_signs,
+                    _unstack_signs, _values, _wrap)
+
+
+def _window_years(index, window):
+    """
+    Length in years of the window ending on each row, measured from its first
+    to its last date like annualized_return and annualized_std do.
+
+    Parameters
+    ----------
+    index : pd.DatetimeIndex of the returns
+    window : int, number of rows in each window
+
+    Returns
+    -------
+    years : np.ndarray
+        nan for the rows before the first full window.
+    """
+    dates = pd.DatetimeIndex(index).to_numpy(dtype="datetime64[ns]")
+    year = np.timedelta64(int(timedelta(days=365.25).total_seconds()), "s")
+    years = np.full(len(dates), np.nan)
+    if len(dates) >= window:
+        span = dates[window - 1:] - dates[:len(dates) - window + 1]
+        years[window - 1:] = span / year
+
+    return years
+
+
+def _rolling(returns, window):
+    """
+    Annualized return and standard deviation of every window in one pass
+
+    The return comes from running sums of log growth and the variance from
+    running sums of the returns and their squares, differenced at the
+    window length, so the cost per row does not depend on the window length.
+    The returns are centered on their mean first; a series whose mean drifts
+    far from its overall mean loses a few digits of the variance.
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of returns
+    window : int, number of rows in each window
+
+    Returns
+    -------
+    annualized_return, annualized_std : np.ndarray
+        Same shape as returns, nan for the rows before the first full window.
+    """
+    if window < 2:
+        raise ValueError("window must be at least 2")
+
+    values = _values(returns)
+    years = _window_years(returns.index, window)
+    if values.ndim == 2:
+        years = years[:, None]
+
+    # Running sums of log growth and of the signs of the growth factors,
+    # differenced at the window length
+    signs = _growth_signs(values)
+    growth = _stack_signs(_log_growth(values), signs)
+    np.cumsum(growth, axis=0, out=growth)
+    total = np.full(growth.shape, np.nan)
+    total[window - 1:] = growth[window - 1:]
+    if len(values) > window:
+        total[window:] -= growth[:len(values) - window]
+    total, signs = _unstack_signs(total, signs)
+    ann_return = _annualize(total, years, signs)
+
+    # Windowed sums of the count, the returns and their squares, centered on
+    # the mean of each column so the differences of the running sums keep
+    # their precision
+    valid = ~np.isnan(values)
+    center = np.where(valid, values, 0).sum(axis=0) / \
+        np.maximum(valid.sum(axis=0), 1)
+    centered = np.where(valid, values - center, 0)
+    sums = np.stack([valid.astype(float), centered, centered * centered])
+    np.cumsum(sums, axis=1, out=sums)
+    windowed = np.full(sums.shape, np.nan)
+    windowed[:, window - 1:] = sums[:, window - 1:]
+    if len(values) > window:
+        windowed[:, window:] -= sums[:, :len(values) - window]
+    count, total, squares = windowed
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        m2 = np.maximum(squares - total * total / count, 0)
+        std = np.sqrt(m2 / (count - 1)) * np.sqrt(count / years)
+    std[count < 2] = np.nan
+
+    return ann_return, std
+
+
+def rolling_annualized_return(returns, window):
+    """
+    Annualized return over a rolling window of periodic returns
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of returns
+    window : int, number of periods in each window, e.g. 36 for three years
+        of monthly returns
+
+    Returns
+    -------
+    annualized_returns : array-like
+        annualized_return of the window ending on each date, nan before the
+        first full window.
+    """
+    return _wrap(_rolling(returns, window)[0], returns)
+
+
+def rolling_annualized_std(returns, window):
+    """
+    Annualized standard deviation (volatility) over a rolling window of
+    periodic returns
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of returns
+    window : int, number of periods in each window
+
+    Returns
+    -------
+    annualized_std : array-like
+        annualized_std of the window ending on each date, nan before the
+        first full window.
+    """
+    return _wrap(_rolling(returns, window)[1], returns)
+
+
+def rolling_sharpe(returns, window, risk_free=0):
+    """
+    Sharpe ratio over a rolling window of periodic returns
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of returns
+    window : int, number of periods in each window
+    risk_free : float, optional
+        Annualized risk free rate
+
+    Returns
+    -------
+    sharpe : array-like
+        Annualized excess return over annualized standard deviation of the
+        window ending on each date.
+    """
+    ann_return, std = _rolling(returns, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return _wrap((ann_return - risk_free) / std, returns)
+
+
+def rolling_stats(returns, window, risk_free=0):
+    """
+    Rolling annualized return, standard deviation and Sharpe ratio computed
+    together in one pass
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of returns
+    window : int, number of periods in each window
+    risk_free : float, optional
+        Annualized risk free rate
+
+    Returns
+    -------
+    stats : pd.DataFrame
+        Columns return, std and sharpe for a Series. For a DataFrame, the
+        columns are (statistic, column) pairs.
+    """
+    ann_return, std = _rolling(returns, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = (ann_return - risk_free) / std
+
+    stats = {"return": ann_return, "std": std, "sharpe": sharpe}
+    if isinstance(returns, pd.DataFrame):
+        return pd.concat({name: _wrap(values, returns)
+                          for name, values in stats.items()}, axis=1)
+    return pd.DataFrame(stats, index=returns.index)
@@ -13,8 +13,205 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from functools import lru_cache
+from pandas.tseries.frequencies import to_offset
+
+from .cache import cached
+from .matrix import ReturnMatrix
+
+
+# Number of cells of the block of rows passed to the log return kernel by
+# the reductions
+_BLOCK_SIZE = 1 << 16
+
+
+def _log_growth(values, out=None):
+    """
+    Log growth factors log|1 + r| of simple returns, with missing returns
+    and returns of -100% as 0. This is the kernel all return computations
+    are built on: products of growth factors become sums, and the result is
+    computed into out without intermediate copies of the input.
+
+    Growth factors of returns of -100% or less are zero or negative, which
+    the log cannot hold. _growth_signs counts them, and _exp_growth puts
+    their sign back on the sums.
+
+    Parameters
+    ----------
+    values : np.ndarray of simple returns
+    out : np.ndarray, optional
+        Array to write the log growth to, a new array by default
+
+    Returns
+    -------
+    log_growth : np.ndarray
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.log1p(values, out=out)
+
+    # One mask for the missing and non-positive factors, then for the
+    # negative ones
+    mask = np.isfinite(out)
+    np.logical_not(mask, out=mask)
+    out[mask] = 0
+    np.less(values, -1, out=mask)
+    if mask.any():
+        out[mask] = np.log(-1 - values[mask])
+
+    return out
+
+
+def _growth_signs(values):
+    """
+    Negative and zero growth factor indicators of returns, None when all
+    growth factors are positive. The check is done in blocks of rows, so
+    the common case allocates nothing the size of values.
+
+    Parameters
+    ----------
+    values : np.ndarray of simple returns
+
+    Returns
+    -------
+    signs : tuple or None
+        Arrays of 1 where 1 + r is negative and where it is zero, which are
+        summed over the same rows as the log growth.
+    """
+    width = int(np.prod(values.shape[1:]))
+    step = max(_BLOCK_SIZE // max(width, 1), 1)
+    for start in range(0, len(values), step):
+        if (values[start:start + step] <= -1).any():
+            break
+    else:
+        return None
+
+    return (values < -1).astype(float), (values == -1).astype(float)
+
+
+def _total_signs(values):
+    """_growth_signs summed over all rows, None when all are positive"""
+    signs = _growth_signs(values)
+    if signs is None:
+        return None
+    return tuple(count.sum(axis=0) for count in signs)
+
+
+def _stack_signs(growth, signs):
+    """Stack log growth with its sign indicators to sum them together"""
+    if signs is None:
+        return growth
+    return np.stack((growth,) + signs, axis=1)
+
+
+def _unstack_signs(sums, signs):
+    """Split sums of the stack of _stack_signs into log growth and signs"""
+    if signs is None:
+        return sums, None
+    return sums[:, 0], (sums[:, 1], sums[:, 2])
+
+
+def _exp_growth(total, signs=None, minus_one=False, out=None):
+    """
+    Growth factors from sums of log growth, with the sign of the product of
+    the factors: negative for an odd count of negative factors, and zero
+    with any zero factor.
+
+    Parameters
+    ----------
+    total : np.ndarray of sums of log growth
+    signs : tuple, optional
+        Sums of the indicators of _growth_signs over the same rows
+    minus_one : bool, optional
+        Return the compounded returns, growth minus one
+    out : np.ndarray, optional
+        Array to write the result to, a new array by default
+
+    Returns
+    -------
+    growth : np.ndarray
+    """
+    out = np.asarray((np.expm1 if minus_one else np.exp)(total, out=out))
+    if signs is not None:
+        negative, zero = signs
+        odd = np.mod(negative, 2) == 1
+        out[odd] = -out[odd] - (2 if minus_one else 0)
+        out[zero > 0] = -1 if minus_one else 0
+
+    return out
+
+
+def _annualize(total, years, signs=None):
+    """
+    Annualized returns from sums of log growth over a number of years, nan
+    where the compounded growth is negative
+
+    Parameters
+    ----------
+    total : np.ndarray of sums of log growth
+    years : float or np.ndarray
+    signs : tuple, optional
+        Sums of the indicators of _growth_signs over the same rows
+
+    Returns
+    -------
+    annualized_return : np.ndarray
+    """
+    result = np.asarray(np.expm1(total / years))
+    if signs is not None:
+        negative, zero = signs
+        result[np.mod(negative, 2) == 1] = np.nan
+        result[zero > 0] = -1
+
+    return result
+
+
+def _total_log_growth(values):
+    """
+    Sum of the log growth of each column, computed in blocks of rows so only
+    one block of log growth is held in memory at a time.
+
+    Parameters
+    ----------
+    values : np.ndarray of simple returns
+
+    Returns
+    -------
+    total : np.ndarray or float
+    """
+    width = int(np.prod(values.shape[1:]))
+    step = max(_BLOCK_SIZE // max(width, 1), 1)
+
+    total = np.zeros(values.shape[1:])
+    buffer = np.empty((min(step, len(values)),) + values.shape[1:])
+    for start in range(0, len(values), step):
+        block = values[start:start + step]
+        total += _log_growth(block, out=buffer[:len(block)]).sum(axis=0)
+
+    return total
+
+
+def _values(returns):
+    """The returns as a float array, without a copy where possible"""
+    return returns.to_numpy(dtype=float, copy=False)
+
+
+def _wrap(values, returns):
+    """Wrap an array computed from returns in the type of returns"""
+    if isinstance(returns, pd.DataFrame):
+        return pd.DataFrame(values, index=returns.index,
+                            columns=returns.columns, copy=False)
+    return pd.Series(values, index=returns.index, name=returns.name,
+                     copy=False)
+
+
+def _wrap_total(values, returns):
+    """Wrap one value per column of returns in the type of a reduction"""
+    if isinstance(returns, pd.DataFrame):
+        return pd.Series(values, index=returns.columns)
+    return float(values)
 
 
 # Return related statistics
@@ -25,54 +222,65 @@ def total_return(returns):
     Parameters
     ----------
     returns : pd.Series of periodic returns
+        Also accepts a pd.DataFrame or a ReturnMatrix, in which case each
+        column is totaled.
 
     Returns
     -------
     total_returns : array-like
         Series of total returns.
     """
+    if isinstance(returns, ReturnMatrix):
+        return returns.apply(total_return)
+
     if len(returns) < 1:
         return returns.copy()
 
-    # Allocate Memory
-    result = returns.copy()
-
-    # Compute cumulative return
-    result = result.add(1, fill_value=0)
-    result = result.prod(skipna=True)
-    result = result.add(-1)
+    values = _values(returns)
+    result = _exp_growth(_total_log_growth(values), _total_signs(values),
+                         minus_one=True)
 
-    return result
+    return _wrap_total(result, returns)
 
 
-def cum_return(returns):
+@cached
+def cum_return(returns, out=None):
     """
     Compute cumulative returns from simple returns.
 
     Parameters
     ----------
     returns : pd.Series of periodic returns
+        Also accepts a pd.DataFrame or a ReturnMatrix, in which case each
+        column is cumulated.
+    out : str, optional
+        Directory to write the result to as a memory-mapped ReturnMatrix,
+        only used when returns is a ReturnMatrix.
 
     Returns
     -------
     cumulative_returns : array-like
         Series of cumulative returns.
     """
+    if isinstance(returns, ReturnMatrix):
+        return returns.apply(cum_return, out=out)
+
     if len(returns) < 1:
         return returns.copy()
 
-    # Allocate Memory
-    result = returns.copy()
+    # Cumulate log growth in place in the result
+    values = _values(returns)
+    result = _log_growth(values)
+    np.cumsum(result, axis=0, out=result)
+    signs = _growth_signs(values)
+    if signs is not None:
+        signs = tuple(np.cumsum(count, axis=0) for count in signs)
+    _exp_growth(result, signs, minus_one=True, out=result)
 
-    # Compute cumulative return
-    result = result.add(1, fill_value=0)
-    result = result.cumprod(skipna=True)
-    result = result.add(-1)
-
-    return result
+    return _wrap(result, returns)
 
 
-def vami(returns, starting_value=1000):
+def vami(returns, starting_value=1000, out=None):
     """
     Compute VAMI (Value Added Monthly Index) from simple returns.
 
@@ -88,17 +296,194 @@ def vami(returns, starting_value=1000):
             2015-07-21    0.004902
          - Also accepts two dimensional data. In this case, each column is
            cumulated.
+         - Also accepts a ReturnMatrix, which is processed in chunks of
+           columns.
     starting_value: float, optional
        The starting returns.
+    out : str, optional
+        Directory to write the result to as a memory-mapped ReturnMatrix,
+        only used when returns is a ReturnMatrix.
 
     Returns
     -------
     vami : array-like
         Series of cumulative returns.
     """
-    result = cum_return(returns)
-    result = result.add(1)
-    result = result.multiply(starting_value)
+    if isinstance(returns, ReturnMatrix):
+        return returns.apply(vami, out=out, starting_value=starting_value)
+
+    if len(returns) < 1:
+        return returns.copy()
+
+    values = _values(returns)
+    result = _log_growth(values)
+    np.cumsum(result, axis=0, out=result)
+    signs = _growth_signs(values)
+    if signs is not None:
+        signs = tuple(np.cumsum(count, axis=0) for count in signs)
+    _exp_growth(result, signs, out=result)
+    result *= starting_value
+
+    return _wrap(result, returns)
+
+
+# Offsets of the periods of period_return, each period labeled by its end
+PERIODS = {
+    "week": pd.offsets.Week(weekday=6),
+    "month": pd.offsets.MonthEnd(),
+    "quarter": pd.offsets.QuarterEnd(),
+    "year": pd.offsets.YearEnd(),
+}
+
+# Number of months in the periods that are made of whole months
+_PERIOD_MONTHS = {"month": 1, "quarter": 3, "year": 12}
+
+
+def _period_ends(period, codes):
+    """
+    Last day of periods from their bucket codes. Weeks are numbered from the
+    one ending on Sunday 1970-01-04, and the other periods count months,
+    quarters or years since 1970.
+
+    Parameters
+    ----------
+    period : week, month, quarter or year
+    codes : np.ndarray of bucket codes
+
+    Returns
+    -------
+    ends : np.ndarray of datetime64[D]
+    """
+    if period == "week":
+        return (codes * 7 + 3).astype("datetime64[D]")
+
+    months = (codes + 1) * _PERIOD_MONTHS[period]
+    return months.astype("datetime64[M]").astype("datetime64[D]") - 1
+
+
+def _sum_periods(growth, codes):
+    """
+    Sum log growth over runs of rows with the same bucket code
+
+    Parameters
+    ----------
+    growth : np.ndarray of log growth, in date order
+    codes : np.ndarray of the nondecreasing bucket code of each row
+
+    Returns
+    -------
+    sums : np.ndarray
+        One row per code from the first to the last, 0 for periods without
+        any rows.
+    codes : np.ndarray of the code of each row of sums
+    """
+    starts = np.flatnonzero(np.append(True, codes[1:] != codes[:-1]))
+    first = codes[0]
+
+    sums = np.zeros((codes[-1] - first + 1,) + growth.shape[1:])
+    sums[codes[starts] - first] = np.add.reduceat(growth, starts, axis=0)
+
+    return sums, np.arange(first, codes[-1] + 1)
+
+
+def _date_order(returns):
+    """The dates and values of returns, sorted by date"""
+    index = pd.DatetimeIndex(returns.index)
+    values = _values(returns)
+    if not index.is_monotonic_increasing:
+        order = np.argsort(index.to_numpy(), kind="mergesort")
+        index = index[order]
+        values = values[order]
+
+    return index, values
+
+
+def _local_days(index):
+    """
+    The calendar day of each date on its local wall clock
+
+    Parameters
+    ----------
+    index : pd.DatetimeIndex, tz-naive or tz-aware
+
+    Returns
+    -------
+    days : np.ndarray of datetime64[D]
+    dtype : np.dtype of the tz-naive dates, for the period labels
+    """
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.to_numpy(dtype="datetime64[D]"), index.dtype
+
+
+def _period_labels(ends, dtype, index, freq=None):
+    """Period end days as dates in the time zone and name of index"""
+    dates = pd.DatetimeIndex(ends.astype(dtype), name=index.name, freq=freq)
+    if index.tz is not None:
+        dates = dates.tz_localize(index.tz)
+    return dates
+
+
+def _wrap_periods(values, dates, returns):
+    """Wrap returns of periods in the type of returns"""
+    if isinstance(returns, pd.DataFrame):
+        return pd.DataFrame(values, index=dates, columns=returns.columns)
+    return pd.Series(values, index=dates, name=returns.name)
+
+
+def period_returns(returns, periods=tuple(PERIODS)):
+    """
+    Convert higher frequency returns to several periodicities at once
+
+    The log growth and the day of each return are computed once. Weekly and
+    monthly returns are sums of log growth over the buckets of each day with
+    np.add.reduceat, and quarterly and annual returns are sums of the
+    monthly ones.
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of returns with higher frequency
+        than the target periodicities
+    periods : list, optional
+        Periodicities to convert the returns to, any of week, month, quarter
+        and year. Defaults to all of them.
+
+    Returns
+    -------
+    period_returns : dict
+        Returns of each periodicity, labeled by the period end.
+    """
+    unknown = set(periods) - set(PERIODS)
+    if unknown:
+        raise ValueError("Unknown periods: {}".format(sorted(unknown)))
+
+    if len(returns) < 1:
+        return {period: returns.copy() for period in periods}
+
+    index, values = _date_order(returns)
+    days, dtype = _local_days(index)
+    signs = _growth_signs(values)
+    growth = _stack_signs(_log_growth(values), signs)
+
+    sums = {}
+    if "week" in periods:
+        weeks = (days.astype(np.int64) + 3) // 7
+        sums["week"] = _sum_periods(growth, weeks)
+    if set(periods) & set(_PERIOD_MONTHS):
+        months = days.astype("datetime64[M]").astype(np.int64)
+        monthly, months = _sum_periods(growth, months)
+        for period, size in _PERIOD_MONTHS.items():
+            if period in periods:
+                sums[period] = _sum_periods(monthly, months // size)
+
+    result = {}
+    for period in periods:
+        values, codes = sums[period]
+        values, period_signs = _unstack_signs(values, signs)
+        values = _exp_growth(values, period_signs, minus_one=True)
+        dates = _period_labels(_period_ends(period, codes), dtype, index,
+                               PERIODS[period])
+        result[period] = _wrap_periods(values, dates, returns)
 
     return result
 
@@ -116,18 +501,7 @@ def weekly_return(returns):
     weekly_returns : array-like
         Series of weekly returns.
     """
-    if len(returns) < 1:
-        return returns.copy()
-
-    # Allocate Memory
-    result = returns.copy()
-
-    # Compute cumulative return
-    result = result.add(1, fill_value=0)
-    result = result.groupby(pd.Grouper(freq="W")).prod()
-    result = result - 1
-
-    return result
+    return period_returns(returns, ["week"])["week"]
 
 
 def monthly_return(returns):
@@ -143,18 +517,7 @@ def monthly_return(returns):
     monthly_returns : array-like
         Series of monthly returns.
     """
-    if len(returns) < 1:
-        return returns.copy()
-
-    # Allocate Memory
-    result = returns.copy()
-
-    # Compute cumulative return
-    result = result.add(1, fill_value=0)
-    result = result.groupby(pd.Grouper(freq="M")).prod()
-    result = result - 1
-
-    return result
+    return period_returns(returns, ["month"])["month"]
 
 
 def quarterly_return(returns):
@@ -170,18 +533,7 @@ def quarterly_return(returns):
     quarterly_returns : array-like
         Series of quarterly returns.
     """
-    if len(returns) < 1:
-        return returns.copy()
-
-    # Allocate Memory
-    result = returns.copy()
-
-    # Compute cumulative return
-    result = result.add(1, fill_value=0)
-    result = result.groupby(pd.Grouper(freq="Q")).prod()
-    result = result - 1
-
-    return result
+    return period_returns(returns, ["quarter"])["quarter"]
 
 
 def annual_return(returns):
@@ -197,50 +549,167 @@ def annual_return(returns):
     annual_returns : array-like
         Series of annual returns.
     """
-    if len(returns) < 1:
-        return returns.copy()
+    return period_returns(returns, ["year"])["year"]
 
-    # Allocate Memory
-    result = returns.copy()
 
-    # Compute cumulative return
-    result = result.add(1, fill_value=0)
-    result = result.groupby(pd.Grouper(freq="A")).prod()
-    result = result - 1
+def _period_offset(period, fiscal_year_end=12):
+    """
+    Offset of the periods named by period
 
-    return result
+    Parameters
+    ----------
+    period : week, month, quarter, year, a pandas offset alias or a
+        pd.DateOffset
+    fiscal_year_end : int, optional
+        Last month of the year, for the quarter and year periods
+
+    Returns
+    -------
+    offset : pd.DateOffset
+    """
+    if period == "quarter":
+        return pd.offsets.QuarterEnd(startingMonth=fiscal_year_end)
+    if period == "year":
+        return pd.offsets.YearEnd(month=fiscal_year_end)
+    if period in PERIODS:
+        return PERIODS[period]
+    return to_offset(period)
 
 
-def period_return(returns, period):
+@lru_cache(maxsize=64)
+def _period_boundaries(offset, holidays, first_year, last_year):
+    """
+    End of each period of offset from the start of first_year to past the
+    end of last_year, cached per calendar so repeated reports reuse them
+
+    Parameters
+    ----------
+    offset : pd.DateOffset of the periods
+    holidays : tuple of np.datetime64 of days that are not trading days, or
+        None to label periods by their calendar end
+    first_year, last_year : int, range of years to cover
+
+    Returns
+    -------
+    ends : np.ndarray of datetime64[D]
+        Last calendar day of each period
+    labels : np.ndarray of datetime64[D]
+        Label of each period, its last trading day when there are holidays
+    """
+    start = pd.Timestamp(first_year, 1, 1)
+    end = pd.Timestamp(last_year, 12, 31) + offset
+    ends = pd.date_range(start, end, freq=offset).to_numpy(
+        dtype="datetime64[D]")
+
+    labels = ends
+    if holidays is not None:
+        trading = pd.bdate_range(start - pd.Timedelta(days=7), end,
+                                 freq="C", holidays=list(holidays))
+        trading = trading.to_numpy(dtype="datetime64[D]")
+        labels = trading[np.searchsorted(trading, ends, side="right") - 1]
+
+    return ends, labels
+
+
+def _calendar_return(returns, offset, holidays=None, calendar=None):
+    """
+    Compound returns into the periods of any offset
+
+    Each period ends on an anchor date of the offset and includes it. The
+    bucket boundaries come from _period_boundaries, starting from 1970 so
+    that multiples of an offset are anchored the same way for any data.
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of returns
+    offset : pd.DateOffset of the periods
+    holidays : list-like of dates, optional
+    calendar : pandas holiday calendar, optional
+
+    Returns
+    -------
+    period_returns : array-like
+        Returns of each period, labeled by the period end.
+    """
+    if len(returns) < 1:
+        return returns.copy()
+
+    index, values = _date_order(returns)
+    days, dtype = _local_days(index)
+    first_year = min(1970, index[0].year)
+    last_year = index[-1].year
+
+    if calendar is not None:
+        holidays = [] if holidays is None else list(holidays)
+        holidays += list(calendar.holidays(pd.Timestamp(first_year, 1, 1),
+                                           pd.Timestamp(last_year + 1, 12,
+                                                        31)))
+    if holidays is not None:
+        holidays = _local_days(pd.DatetimeIndex(holidays))[0]
+        holidays = tuple(np.unique(holidays))
+
+    ends, labels = _period_boundaries(offset, holidays, first_year,
+                                      last_year)
+    codes = np.searchsorted(ends, days)
+    signs = _growth_signs(values)
+    values, codes = _sum_periods(
+        _stack_signs(_log_growth(values), signs), codes)
+    values, signs = _unstack_signs(values, signs)
+    values = _exp_growth(values, signs, minus_one=True)
+
+    dates = _period_labels(labels[codes], dtype, index)
+    return _wrap_periods(values, dates, returns)
+
+
+@cached
+def period_return(returns, period, fiscal_year_end=12, holidays=None,
+                  calendar=None):
     """
     Convert higher frequency returns
 
     Parameters
     ----------
     returns : pd.Series of returns with higher frequency than the target
-      periodicity
+      periodicity. Also accepts a pd.DataFrame or a ReturnMatrix, in which
+      case each column is converted.
     period : the target periodicity to convert the returns to, options are
         - week
         - month
         - quarter
         - year
+        - any pandas offset alias or pd.DateOffset, e.g. "2W" or "QE-JUN".
+          Each period ends on an anchor date of the offset and includes it.
+    fiscal_year_end : int, optional
+        Last month of the fiscal year, e.g. 6 for years ending in June. Used
+        for the quarter and year periods.
+    holidays : list-like of dates, optional
+        Days that are not trading days. If given, each period is labeled by
+        its last trading day instead of its last calendar day.
+    calendar : pandas holiday calendar, optional
+        e.g. pandas.tseries.holiday.USFederalHolidayCalendar(), adds its
+        holidays to holidays
 
     Returns
     -------
     monthly_returns : array-like
         Series of annual returns.
     """
-    return_func = {
-        "week": weekly_return,
-        "month": monthly_return,
-        "quarter": quarterly_return,
-        "year": annual_return,
-    }
+    if isinstance(returns, ReturnMatrix):
+        return returns.apply(period_return, period=period,
+                             fiscal_year_end=fiscal_year_end,
+                             holidays=holidays, calendar=calendar)
 
-    result = returns.copy()
-    result = return_func[period](returns)
+    calendar_periods = period not in PERIODS
+    if holidays is not None or calendar is not None:
+        calendar_periods = True
+    if fiscal_year_end != 12 and period in ("quarter", "year"):
+        calendar_periods = True
 
-    return result
+    if calendar_periods:
+        offset = _period_offset(period, fiscal_year_end)
+        return _calendar_return(returns, offset, holidays, calendar)
+
+    return period_returns(returns, [period])[period]
 
 
 def annualized_return(returns, start_date=None, end_date=None):
@@ -261,8 +730,6 @@ def annualized_return(returns, start_date=None, end_date=None):
     annualized_returns : array-like
         Series of annualized returns.
     """
-    result = returns.copy()
-
     if start_date is None:
         start_date = returns.index[0]
     else:
@@ -274,10 +741,11 @@ def annualized_return(returns, start_date=None, end_date=None):
 
     diff_in_years = ((end_date - start_date).total_seconds() / timedelta(days=365.25).total_seconds())
 
-    result = total_return(result)
-    result = (result.add(1) ** (1 / diff_in_years)) - 1
+    values = _values(returns)
+    result = _annualize(_total_log_growth(values), diff_in_years,
+                        _total_signs(values))
 
-    return result
+    return _wrap_total(result, returns)
 
 
 # Risk related statistics
@@ -299,8 +767,6 @@ def annualized_std(returns, start_date=None, end_date=None):
     annualized_returns : array-like
         Series of annualized returns.
     """
-    result = returns.copy()
-
     if start_date is None:
         start_date = returns.index[0]
     else:
@@ -312,6 +778,6 @@ def annualized_std(returns, start_date=None, end_date=None):
 
     diff_in_years = ((end_date - start_date).total_seconds() / timedelta(days=365.25).total_seconds())
 
-    result = result.std() * ((result.count() / diff_in_years) ** 0.5)
+    result = returns.std() * ((returns.count() / diff_in_years) ** 0.5)
 
     return result
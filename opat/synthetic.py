@@ -0,0 +1,333 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# Business days in a year of the synthetic calendar
+DAYS_PER_YEAR = 261
+
+# Trades are drawn a week of business days at a time, and sell from the
+# positions held at the start of the week
+DAYS_PER_TRADE_BLOCK = 5
+
+_STREAMS = ["tickers", "events", "growth", "gap", "high", "low", "volume",
+            "trade_days", "account", "ticker", "quantity", "sell", "noise",
+            "pick", "flow_draw", "flow_amount"]
+
+
+class _Streams(object):
+    """Independent random streams of one synthetic portfolio
+
+    Each kind of value draws from its own stream, one value after another,
+    so changing the number of trades does not change the prices, the
+    corporate actions can be replayed on their own, and splitting the days
+    into other chunks draws the same values.
+    """
+
+    def __init__(self, seed):
+        sequence = np.random.SeedSequence(seed)
+        self.seeds = dict(zip(_STREAMS, sequence.spawn(len(_STREAMS))))
+
+    def get(self, name):
+        return np.random.default_rng(self.seeds[name])
+
+
+def _blocks(days, tickers, chunksize):
+    """Slices of days with about chunksize price rows each, in whole trade
+    blocks"""
+    step = max(1, chunksize // tickers // DAYS_PER_TRADE_BLOCK)
+    step *= DAYS_PER_TRADE_BLOCK
+    return [slice(start, min(start + step, days))
+            for start in range(0, days, step)]
+
+
+def _events(rng, shape, dividend_rate, split_rate):
+    """Dividend and split days of a block
+
+    Returns:
+        [tuple] -- dividend mask and split ratio (1 without a split) of each
+            day and ticker
+    """
+
+    draw = rng.random(shape)
+    dividend = draw < dividend_rate / DAYS_PER_YEAR
+    split_low = dividend_rate / DAYS_PER_YEAR
+    split_high = split_low + split_rate / DAYS_PER_YEAR
+    is_split = (draw >= split_low) & (draw < split_high)
+
+    # One split in five is 3 for 1, the others 2 for 1
+    three = draw >= split_high - (split_high - split_low) / 5
+    ratio = np.where(is_split, np.where(three, 3.0, 2.0), 1.0)
+
+    return dividend, ratio
+
+
+def generate(accounts=1, tickers=20, years=1, trades_per_day=1,
+             dividend_rate=2, split_rate=0.02, seed=0, start="2017-01-02",
+             chunksize=1000000):
+    """Generate a synthetic portfolio as chunks of trades, prices and flows
+
+    Prices are geometric random walks with a volatility and volume for each
+    ticker. Dividends are paid out of the price on the ex-day, splits divide
+    the close by their ratio, and adj is the close adjusted for all later
+    dividends and splits, so it equals close on the last day. Trades are at
+    a price between the low and high of the day, sells never exceed the
+    quantity held, and each account deposits cash on its first day and then
+    deposits or withdraws at the start of some months.
+
+    The output only depends on the arguments other than chunksize, so the
+    same seed gives the same records however they are chunked. Only one
+    chunk of days is in memory at a time.
+
+    Keyword Arguments:
+        accounts {int} -- number of accounts (default: {1})
+        tickers {int} -- number of tickers (default: {20})
+        years {int} -- number of years of business days (default: {1})
+        trades_per_day {float} -- mean number of trades a day, over all
+            accounts (default: {1})
+        dividend_rate {float} -- mean number of dividends per ticker and
+            year (default: {2})
+        split_rate {float} -- mean number of splits per ticker and year
+            (default: {0.02})
+        seed {int} -- random seed (default: {0})
+        start {str} -- first day (default: {"2017-01-02"})
+        chunksize {int} -- number of price rows in a chunk, rounded down
+            to whole weeks of at least one week (default: {1000000})
+
+    Yields:
+        [tuple] -- trades, prices and flows DataFrames of a chunk of days,
+            each sorted by tradeday
+    """
+
+    streams = _Streams(seed)
+    days = pd.bdate_range(start, periods=DAYS_PER_YEAR * years,
+                          name="tradeday")
+    names = np.array(["T{:05d}".format(i) for i in range(tickers)])
+    owners = np.array(["A{:04d}".format(i) for i in range(accounts)])
+    blocks = _blocks(len(days), tickers, chunksize)
+    month_start = np.append(True, days.month[1:] != days.month[:-1])
+
+    rng = streams.get("tickers")
+    volatility = rng.uniform(0.008, 0.03, tickers)
+    drift = rng.normal(0.0003, 0.0003, tickers)
+    dividend_yield = rng.uniform(0.002, 0.012, tickers)
+    base_volume = rng.lognormal(13, 1.5, tickers)
+    close = rng.uniform(10, 200, tickers)
+
+    # The adjustment of every day depends on the dividends and splits after
+    # it, so replay the corporate actions once for their total
+    rng = streams.get("events")
+    total_factor = np.ones(tickers)
+    for block in blocks:
+        dividend, ratio = _events(rng, (block.stop - block.start, tickers),
+                                  dividend_rate, split_rate)
+        factor = np.where(dividend, 1 - dividend_yield, 1) / ratio
+        total_factor *= factor.prod(axis=0)
+
+    rngs = {name: streams.get(name) for name in _STREAMS[1:]}
+    factor_so_far = np.ones(tickers)
+    held = np.zeros((accounts, tickers))
+
+    for block in blocks:
+        dates = days[block]
+        shape = (len(dates), tickers)
+        dividend, ratio = _events(rngs["events"], shape, dividend_rate,
+                                  split_rate)
+        factor = np.where(dividend, 1 - dividend_yield, 1) / ratio
+
+        # The close moves by its growth and the corporate actions of the day
+        growth = rngs["growth"].standard_normal(shape) * volatility + drift
+        step = np.exp(growth) * factor
+        closes = close * np.cumprod(step, axis=0)
+        previous = np.vstack([close, closes[:-1]])
+        close = closes[-1]
+
+        gap = np.exp(rngs["gap"].standard_normal(shape) * volatility / 4)
+        opens = previous * factor * gap
+        high = np.abs(rngs["high"].standard_normal(shape))
+        high = np.maximum(opens, closes) * np.exp(high * volatility / 2)
+        low = np.abs(rngs["low"].standard_normal(shape))
+        low = np.minimum(opens, closes) * np.exp(-low * volatility / 2)
+        volume = base_volume * rngs["volume"].lognormal(0, 0.4, shape)
+
+        factors = factor_so_far * np.cumprod(factor, axis=0)
+        factor_so_far = factors[-1]
+        adj = closes * total_factor / factors
+
+        prices = pd.DataFrame({
+            "tradeday": np.repeat(dates.values, tickers),
+            "ticker": np.tile(names, len(dates)),
+            "open": opens.ravel().round(2),
+            "high": high.ravel().round(2),
+            "low": low.ravel().round(2),
+            "close": closes.ravel().round(2),
+            "adj": adj.ravel().round(4),
+            "volume": volume.ravel().astype(np.int64),
+            "dividend": np.where(dividend, previous * dividend_yield,
+                                 0).ravel().round(4),
+            "split": ratio.ravel().astype(np.int64),
+        })
+
+        trades = []
+        for start in range(0, len(dates), DAYS_PER_TRADE_BLOCK):
+            week = slice(start, start + DAYS_PER_TRADE_BLOCK)
+            week_trades, held = _trades(rngs, dates[week], trades_per_day,
+                                        held, closes[week], low[week],
+                                        high[week], ratio[week], names,
+                                        owners)
+            trades.append(week_trades)
+        trades = pd.concat(trades, ignore_index=True)
+        flows = _flows(rngs, dates, month_start[block], block.start == 0,
+                       owners)
+
+        yield trades, prices, flows
+
+
+def _trades(rngs, dates, trades_per_day, held, closes, low, high, ratio,
+            names, owners):
+    """Trades of a block of days and the quantities held after them
+
+    Sells are of positions held at the start of the block, and the
+    quantities sold in the block are capped by the quantity held then,
+    which splits in the block can only increase. Integers are drawn as
+    scaled uniform values, which unlike rng.integers take the same values
+    however the draws are split.
+    """
+
+    accounts, tickers = held.shape
+    day = np.repeat(np.arange(len(dates)),
+                    rngs["trade_days"].poisson(trades_per_day, len(dates)))
+    size = len(day)
+    account = (rngs["account"].random(size) * accounts).astype(int)
+    ticker = (rngs["ticker"].random(size) * tickers).astype(int)
+    quantity = np.floor(rngs["quantity"].random(size) * 100) + 1
+    sell = rngs["sell"].random(size) < 0.4
+    noise = rngs["noise"].normal(0, 0.002, size)
+    pick = rngs["pick"].random(size)
+
+    # A sell is of a random position the account holds, or a buy if it
+    # holds none
+    positions = np.flatnonzero(held.ravel() > 0)
+    counts = np.bincount(positions // tickers, minlength=accounts)
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    sell &= counts[account] > 0
+    chosen = offsets[account] + (pick * counts[account]).astype(int)
+    chosen = positions[np.minimum(chosen, len(positions) - 1)] % tickers \
+        if len(positions) else ticker
+    ticker = np.where(sell, chosen, ticker)
+
+    # Cap the cumulative quantity sold of each position by the quantity held
+    position = account * tickers + ticker
+    order = np.lexsort((np.arange(size), position))
+    sold = np.where(sell, quantity, 0)[order]
+    cumulative = np.cumsum(sold)
+    first = np.ones(size, dtype=bool)
+    first[1:] = position[order][1:] != position[order][:-1]
+    base = np.maximum.accumulate(np.where(first, cumulative - sold, 0))
+    cumulative -= base
+    capped = np.minimum(cumulative, held.ravel()[position[order]])
+    allowed = np.diff(np.concatenate([[0], capped]))
+    allowed[first] = capped[first]
+    quantity[order[sold > 0]] = allowed[sold > 0]
+    keep = ~sell | (quantity > 0)
+
+    price = closes[day, ticker] * np.exp(noise)
+    price = np.clip(price, low[day, ticker], high[day, ticker]).round(2)
+
+    # Quantities held at the end of the block, with the later splits
+    after = np.cumprod(ratio[::-1], axis=0)[::-1]
+    after = np.vstack([after[1:], np.ones(tickers)])
+    change = np.where(sell, -quantity, quantity) * after[day, ticker]
+    held = held * after[0] * ratio[0]
+    np.add.at(held.ravel(), position[keep], change[keep])
+    held = np.maximum(held, 0)
+
+    trades = pd.DataFrame({
+        "tradeday": dates.values[day],
+        "account": owners[account],
+        "ticker": names[ticker],
+        "action": np.where(sell, "Sell", "Buy"),
+        "price": price,
+        "quantity": quantity.astype(np.int64),
+    })
+    return trades[keep].reset_index(drop=True), held
+
+
+def _flows(rngs, dates, month_start, first, owners):
+    """Deposits and withdrawals of a block of days
+
+    Each account deposits on the first day, and on the first day of each
+    later month deposits with probability 1/2 and withdraws with
+    probability 1/20.
+    """
+
+    month_start = np.flatnonzero(month_start)
+    if first:
+        month_start = month_start[month_start != 0]
+    account = np.tile(np.arange(len(owners)), len(month_start))
+    month_start = np.repeat(month_start, len(owners))
+    draw = rngs["flow_draw"].random(len(month_start))
+    amount = rngs["flow_amount"].uniform(100, 5000,
+                                         len(month_start)).round(2)
+    deposit = draw < 0.5
+    withdraw = draw > 0.95
+
+    day = np.concatenate([np.zeros(len(owners) if first else 0, dtype=int),
+                          month_start[deposit], month_start[withdraw]])
+    account = np.concatenate([np.arange(len(owners) if first else 0),
+                              account[deposit], account[withdraw]])
+    amount = np.concatenate([np.full(len(owners) if first else 0, 100000.0),
+                             amount[deposit], -amount[withdraw]])
+    action = np.where(amount > 0, "Deposit", "Withdrawal")
+
+    order = np.lexsort((account, day))
+    return pd.DataFrame({
+        "tradeday": dates.values[day[order]],
+        "account": owners[account[order]],
+        "action": action[order],
+        "amount": amount[order],
+    })
+
+
+def write_csv(path, accounts=1, tickers=20, years=1, trades_per_day=1,
+              dividend_rate=2, split_rate=0.02, seed=0, start="2017-01-02",
+              chunksize=1000000):
+    """Write a synthetic portfolio to trades.csv, prices.csv and flows.csv
+
+    The files have the columns of the test data and are written one chunk
+    at a time, so the prices can be much larger than memory. See generate
+    for the arguments.
+
+    Arguments:
+        path {str} -- directory of the csv files, created if needed
+
+    Returns:
+        [dict] -- path of the trades, prices and flows files
+    """
+
+    os.makedirs(path, exist_ok=True)
+    files = {name: os.path.join(path, name + ".csv")
+             for name in ("trades", "prices", "flows")}
+    chunks = generate(accounts, tickers, years, trades_per_day,
+                      dividend_rate, split_rate, seed, start, chunksize)
+
+    for i, frames in enumerate(chunks):
+        for name, frame in zip(("trades", "prices", "flows"), frames):
+            frame.to_csv(files[name], mode="w" if i == 0 else "a",
+                         header=i == 0, index=False, date_format="%Y-%m-%d")
+    return files
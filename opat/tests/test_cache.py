@@ -0,0 +1,113 @@
+import os
+import tempfile
+
+from datetime import date
+
+import pandas as pd
+
+import opat.cache
+from opat.cache import Cache, caching, fingerprint
+from opat.matrix import ReturnMatrix
+from opat.portfolio import create_holdings, create_nav, create_pnl
+from opat.stats import cum_return, period_return
+
+__location__ = os.path.realpath(os.path.join(
+    os.getcwd(), os.path.dirname(__file__)))
+
+
+def read_csv(name):
+    return pd.read_csv(__location__ + '/test_data/' + name,
+                       parse_dates=[0], header=0)
+
+
+def test_caching_reuses_results():
+    trades = read_csv('trades.csv')
+    prices = read_csv('prices.csv')
+    returns = pd.read_csv(__location__ + '/test_data/fund_return.csv',
+                          parse_dates=[0], header=0, index_col=0)
+    assert fingerprint(trades) == fingerprint(trades.copy())
+    assert fingerprint(returns) != fingerprint(returns * 2)
+    assert fingerprint(returns) != fingerprint(returns.rename_axis("day"))
+    assert fingerprint(returns) != fingerprint(
+        returns.rename_axis("fund", axis=1))
+    assert fingerprint(returns["Tivoli"]) != fingerprint(
+        returns["Tivoli"].rename_axis("day"))
+
+    with tempfile.TemporaryDirectory() as folder:
+        with caching(Cache(path=folder)) as cache:
+            holdings = create_holdings(trades, prices)
+            # create_pnl calls create_holdings with the same arguments
+            pnl = create_pnl(trades, prices)
+            assert cache.stats["hits"] == 1
+            # and so does create_nav
+            nav = create_nav(trades, prices, read_csv('flows.csv'))
+            assert cache.stats["hits"] == 2
+
+            sparse = create_holdings(trades, prices, sparse=True)
+            sparse.runs["quantity"] = 0
+            sparse = create_holdings(trades, prices, sparse=True)
+            assert (sparse.runs["quantity"] != 0).all()
+            assert cache.stats["hits"] == 3
+
+            # Without prices the holdings are keyed by the day they end
+            create_holdings(trades)
+            create_holdings(trades, end_date=date.today())
+            assert cache.stats["hits"] == 4
+
+            cum_return(returns)
+            result = cum_return(returns.copy())
+            assert cache.stats["hits"] == 5
+            result.iloc[0, 0] = 1
+            pd.testing.assert_frame_equal(cum_return(returns),
+                                          cum_return.__wrapped__(returns))
+
+        pd.testing.assert_frame_equal(holdings,
+                                      create_holdings(trades, prices))
+        pd.testing.assert_frame_equal(pnl, create_pnl(trades, prices))
+        pd.testing.assert_frame_equal(
+            nav, create_nav(trades, prices, read_csv('flows.csv')))
+
+        # A cache of another opat version does not read them
+        version = opat.cache.__version__
+        opat.cache.__version__ = version + ".other"
+        try:
+            other = Cache(path=folder)
+            with caching(other):
+                create_pnl(trades, prices)
+            assert other.stats["disk_hits"] == 0
+        finally:
+            opat.cache.__version__ = version
+
+        # A new cache reads the results back from disk
+        small = Cache(max_items=1, path=folder)
+        with caching(small):
+            create_pnl(trades, prices)
+            cum_return(returns)
+        assert small.stats["disk_hits"] == 2
+        assert small.stats["misses"] == 0
+        assert small.stats["evictions"] == 1
+        assert len(small) == 1
+
+
+def test_caching_skips_return_matrix():
+    returns = pd.read_csv(__location__ + '/test_data/fund_return.csv',
+                          parse_dates=[0], header=0, index_col=0)
+
+    with tempfile.TemporaryDirectory() as folder:
+        matrix = ReturnMatrix.from_frame(returns, os.path.join(folder, "in"),
+                                         chunksize=1)
+        out = os.path.join(folder, "out")
+        with caching() as cache:
+            # Each call writes its result to out
+            for _ in range(2):
+                result = cum_return(matrix, out=out)
+                pd.testing.assert_frame_equal(result.to_frame(),
+                                              cum_return.__wrapped__(returns),
+                                              check_freq=False)
+                result.values[:] = 0
+            monthly = period_return(matrix, "month")
+            assert cache.stats["items"] == 0
+            assert cache.stats["hits"] + cache.stats["misses"] == 0
+
+        pd.testing.assert_frame_equal(monthly,
+                                      period_return(returns, "month"))
@@ -0,0 +1,105 @@
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from opat.drawdown import (drawdown, max_drawdown, drawdown_duration,
+                           recovery_time, top_drawdowns)
+from opat.stats import vami
+
+__location__ = os.path.realpath(os.path.join(
+    os.getcwd(), os.path.dirname(__file__)))
+
+
+def loop_drawdowns(returns):
+    """Drawdown episodes of one series found with a loop over dates"""
+    wealth, peak, episodes, current = 1.0, 1.0, [], None
+    for i, value in enumerate(returns.fillna(0)):
+        wealth *= 1 + value
+        if wealth >= peak:
+            if current is not None and current["drawdown"] < 0:
+                current["recovery"] = i
+                episodes.append(current)
+            peak = wealth
+            current = {"peak": i, "trough": i, "drawdown": 0,
+                       "recovery": None}
+        else:
+            if current is None:
+                current = {"peak": -1, "trough": i, "drawdown": 0,
+                           "recovery": None}
+            if wealth / peak - 1 < current["drawdown"]:
+                current["drawdown"] = wealth / peak - 1
+                current["trough"] = i
+    if current is not None and current["drawdown"] < 0:
+        episodes.append(current)
+    return sorted(episodes, key=lambda episode: episode["drawdown"])
+
+
+def test_drawdowns_match_loop():
+    returns = pd.read_csv(__location__ + '/test_data/fund_return.csv',
+                          parse_dates=[0], header=0, index_col=0)
+    rng = np.random.RandomState(1)
+    returns["noise"] = rng.normal(0.001, 0.02, len(returns))
+    returns["flat"] = 0.001
+
+    values = vami(returns, 1)
+    expected = values / np.maximum(values.cummax(), 1) - 1
+    pd.testing.assert_frame_equal(drawdown(returns), expected,
+                                  check_freq=False)
+    pd.testing.assert_series_equal(max_drawdown(returns), expected.min())
+    assert (drawdown_duration(returns)["flat"] == 0).all()
+
+    table = top_drawdowns(returns, 3)
+    recovery = recovery_time(returns)
+    for column in returns:
+        episodes = loop_drawdowns(returns[column])[:3]
+        if not episodes:
+            assert column not in table.index.get_level_values(0)
+            assert recovery[column] == 0
+            continue
+        result = table.loc[column]
+        assert len(result) == len(episodes)
+        np.testing.assert_allclose(result["drawdown"],
+                                   [e["drawdown"] for e in episodes])
+        assert list(result["trough"]) == \
+            [returns.index[e["trough"]] for e in episodes]
+        worst = episodes[0]
+        if worst["recovery"] is None:
+            assert np.isnan(recovery[column])
+            assert pd.isnull(result["recovery"].iloc[0])
+        else:
+            assert recovery[column] == worst["recovery"] - worst["trough"]
+
+
+def test_drawdowns_of_empty_returns():
+    returns = pd.read_csv(__location__ + '/test_data/fund_return.csv',
+                          parse_dates=[0], header=0, index_col=0)
+    full = top_drawdowns(returns)
+    for empty in [returns.iloc[:0], returns["Tivoli"].iloc[:0],
+                  returns.iloc[:, :0]]:
+        for func in [drawdown, max_drawdown, drawdown_duration,
+                     recovery_time]:
+            assert func(empty).size == 0
+        table = top_drawdowns(empty)
+        assert len(table) == 0
+        assert list(table.columns) == list(full.columns)
+        assert table.index.nlevels == empty.ndim
+        assert (table.dtypes == full.dtypes).all()
+
+
+def test_drawdowns_at_or_below_minus_100_percent():
+    returns = pd.read_csv(__location__ + '/test_data/fund_return.csv',
+                          parse_dates=[0], header=0, index_col=0)
+    returns.iloc[5, 0] = -1.2
+    returns.iloc[30, 0] = -2.5
+    returns.iloc[80, 0] = -1.5
+    returns.iloc[50, 1] = -1
+    returns.iloc[60, 1] = np.nan
+    growth = returns.add(1, fill_value=0)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        wealth = growth.cumprod()
+        peak = wealth.cummax().clip(lower=1)
+        pd.testing.assert_frame_equal(drawdown(returns), wealth / peak - 1)
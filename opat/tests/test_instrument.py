@@ -0,0 +1,56 @@
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+from opat.instrument import Recorder, instrumenting, stage
+from opat.portfolio import create_nav, create_pnl
+
+__location__ = os.path.realpath(os.path.join(
+    os.getcwd(), os.path.dirname(__file__)))
+
+
+def read_csv(name):
+    return pd.read_csv(__location__ + '/test_data/' + name,
+                       parse_dates=[0], header=0)
+
+
+def test_instrumenting_records_stages():
+    trades = read_csv('trades.csv')
+    prices = read_csv('prices.csv')
+    flows = read_csv('flows.csv')
+
+    ended = []
+    with instrumenting(Recorder(callbacks=[ended.append])) as recorder:
+        nav = create_nav(trades, prices, flows)
+        with stage("outside"):
+            pass
+    create_pnl(trades, prices)
+
+    pd.testing.assert_frame_equal(nav, create_nav(trades, prices, flows))
+    assert len(ended) == len(recorder.events)
+
+    report = recorder.report()
+    assert report.index[0] == "create_nav"
+    assert {"create_holdings", "create_holdings.runs", "create_nav.merge",
+            "create_nav.market_value", "create_nav.sort",
+            "outside"} <= set(report.index)
+    assert "create_pnl" not in report.index
+    assert report.loc["create_nav", "rows"] == len(nav)
+    assert report.loc["create_nav", "calls"] == 1
+
+    # An outer stage includes the time and memory of its inner stages
+    inner = report.index.str.startswith("create_nav.")
+    assert report.loc["create_nav", "time"] >= report.loc[inner, "time"].sum()
+    assert report.loc["create_nav", "peak_memory"] >= \
+        report["peak_memory"][inner].max()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "trace.json")
+        recorder.chrome_trace(path)
+        with open(path) as f:
+            trace = json.load(f)
+    events = trace["traceEvents"]
+    assert len(events) == len(recorder.events)
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
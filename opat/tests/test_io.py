@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from opat.portfolio import create_pnl
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    raise unittest.SkipTest("pyarrow is required for the columnar cache")
+
+from opat.io import csv_to_cache, read_cache, read_prices  # noqa: E402
+
+__location__ = os.path.realpath(os.path.join(
+    os.getcwd(), os.path.dirname(__file__)))
+
+prices_csv = __location__ + '/test_data/prices.csv'
+trades_csv = __location__ + '/test_data/trades.csv'
+
+
+def test_price_cache_round_trip():
+    for partition_by in ["year", "ticker"]:
+        check_price_cache_round_trip(partition_by)
+
+
+def check_price_cache_round_trip(partition_by):
+    prices = pd.read_csv(prices_csv, parse_dates=[0], header=0)
+    trades = pd.read_csv(trades_csv, parse_dates=[0], header=0)
+
+    with tempfile.TemporaryDirectory() as folder:
+        csv_to_cache(prices_csv, folder, partition_by, chunksize=5000)
+        cached = read_prices(folder)
+        assert list(cached.columns) == ["tradeday", "ticker", "close",
+                                        "dividend", "split"]
+        pd.testing.assert_frame_equal(create_pnl(trades, cached),
+                                      create_pnl(trades, prices))
+
+        cached = read_cache(folder, ["tradeday", "ticker", "close"],
+                            "2018-01-01", "2018-03-31", ["KR", "JD"])
+        assert cached["tradeday"].between("2018-01-01", "2018-03-31").all()
+        assert set(cached["ticker"]) == {"KR", "JD"}
+        expected = prices[prices["ticker"].isin(["KR", "JD"])]
+        expected = expected[
+            expected["tradeday"].between("2018-01-01", "2018-03-31")]
+        assert len(cached) == len(expected)
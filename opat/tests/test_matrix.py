@@ -0,0 +1,44 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from opat.matrix import ReturnMatrix
+from opat.stats import cum_return, total_return, vami, period_return
+
+__location__ = os.path.realpath(os.path.join(
+    os.getcwd(), os.path.dirname(__file__)))
+
+
+def make_returns():
+    returns = pd.read_csv(__location__ + '/test_data/fund_return.csv',
+                          parse_dates=[0], header=0, index_col=0)
+    rng = np.random.RandomState(0)
+    noise = rng.normal(0, 0.01, size=(len(returns), 5))
+    extra = pd.DataFrame(noise, index=returns.index,
+                         columns=["fund{}".format(i) for i in range(5)])
+    return pd.concat([returns, extra], axis=1)
+
+
+def test_return_matrix_matches_frame():
+    returns = make_returns()
+
+    with tempfile.TemporaryDirectory() as folder:
+        ReturnMatrix.from_frame(returns, os.path.join(folder, "returns"))
+        matrix = ReturnMatrix.open(os.path.join(folder, "returns"),
+                                   chunksize=3)
+        assert matrix.shape == returns.shape
+
+        pd.testing.assert_series_equal(total_return(matrix),
+                                       total_return(returns))
+        pd.testing.assert_frame_equal(period_return(matrix, "week"),
+                                      period_return(returns, "week"))
+        pd.testing.assert_frame_equal(cum_return(matrix),
+                                      cum_return(returns))
+
+        result = vami(matrix, out=os.path.join(folder, "vami"))
+        assert isinstance(result, ReturnMatrix)
+        result = ReturnMatrix.open(os.path.join(folder, "vami"))
+        pd.testing.assert_frame_equal(result.to_frame(), vami(returns),
+                                      check_freq=False)
@@ -0,0 +1,71 @@
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from opat.online import ReturnAccumulator
+from opat import stats
+
+__location__ = os.path.realpath(os.path.join(
+    os.getcwd(), os.path.dirname(__file__)))
+
+
+def test_accumulator_matches_batch():
+    returns = pd.read_csv(__location__ + '/test_data/fund_return.csv',
+                          parse_dates=[0], header=0, index_col=0)
+    returns.iloc[5, 0] = np.nan
+
+    # Tick by tick for a while, then the rest in one block, with the
+    # benchmark only joining on the second tick
+    accumulator = ReturnAccumulator()
+    accumulator.update(returns.index[0], {"Tivoli": returns.iloc[0, 0]})
+    for timestamp, row in returns.iloc[1:50].iterrows():
+        accumulator.update(timestamp, row)
+    accumulator.extend(returns.iloc[50:])
+
+    expected = returns.copy()
+    expected.iloc[0, 1] = np.nan
+    for name in ["total_return", "annualized_return", "annualized_std"]:
+        pd.testing.assert_series_equal(getattr(accumulator, name)(),
+                                       getattr(stats, name)(expected),
+                                       rtol=1e-10)
+    pd.testing.assert_series_equal(accumulator.vami(),
+                                   stats.vami(expected).iloc[-1],
+                                   check_names=False)
+
+    single = ReturnAccumulator()
+    for timestamp, value in returns["Tivoli"].items():
+        single.update(timestamp, value)
+    assert np.isclose(single.annualized_std(),
+                      stats.annualized_std(returns["Tivoli"]))
+
+    try:
+        single.update(returns.index[0], 0.01)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("out of order returns must raise ValueError")
+
+
+def test_accumulator_at_or_below_minus_100_percent():
+    returns = pd.read_csv(__location__ + '/test_data/fund_return.csv',
+                          parse_dates=[0], header=0, index_col=0)
+    returns.iloc[5, 0] = -1.2
+    returns.iloc[30, 0] = -2.5
+    returns.iloc[80, 0] = -1.5
+    returns.iloc[50, 1] = -1
+    returns.iloc[60, 1] = np.nan
+    growth = returns.add(1, fill_value=0)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        accumulator = ReturnAccumulator(100)
+        accumulator.extend(returns.iloc[:40]).extend(returns.iloc[40:])
+        pd.testing.assert_series_equal(accumulator.total_return(),
+                                       growth.prod() - 1)
+
+        # The compounded growth of Tivoli is negative, which has no
+        # annualized return, and the benchmark lost everything
+        assert np.isnan(accumulator.annualized_return()["Tivoli"])
+        assert np.isclose(accumulator.annualized_return()["S&P 500"], -1)
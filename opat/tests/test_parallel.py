@@ -0,0 +1,62 @@
+import tempfile
+
+import pandas as pd
+
+from opat.parallel import run_parallel, _share_prices, _run_shard
+from opat.portfolio import create_holdings, create_pnl, create_nav, \
+    create_dividends
+from opat.tests.test_portfolio import make_trades, make_prices, make_flows
+
+
+def make_accounts():
+    trades = make_trades()
+    other = trades.copy()
+    other["account"] = "TEST02"
+    other["quantity"] = other["quantity"] * 3
+    trades = pd.concat([trades, other], ignore_index=True)
+    flows = make_flows()
+    other = flows.copy()
+    other["account"] = "TEST02"
+    flows = pd.concat([flows, other], ignore_index=True)
+    return trades, flows
+
+
+def test_parallel_matches_serial():
+    trades, flows = make_accounts()
+    prices = make_prices()
+
+    expected = create_nav(trades, prices, flows, by_account=True)
+    result = run_parallel(create_nav, trades, prices, flows, workers=2)
+    pd.testing.assert_frame_equal(result, expected)
+
+    expected = create_pnl(trades, prices)
+    result = run_parallel(create_pnl, trades, prices, shard_by="ticker",
+                          workers=2)
+    pd.testing.assert_frame_equal(result, expected)
+
+    expected = create_holdings(trades, prices)
+    result = run_parallel(create_holdings, trades, prices,
+                          shard_by="ticker", workers=2)
+    pd.testing.assert_frame_equal(result, expected)
+
+    expected = create_dividends(trades, prices, by_account=True)
+    result = run_parallel(create_dividends, trades, prices, workers=2)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_account_shard_reads_traded_tickers():
+    trades, flows = make_accounts()
+    trades = trades[trades["ticker"] == "AAA"]
+    prices = make_prices()
+
+    with tempfile.TemporaryDirectory() as folder:
+        store = _share_prices(prices, folder)
+        shard = {"trades": trades, "flows": flows}
+        result = _run_shard(create_nav, shard, store, "account", None)
+
+    # BBB is never traded, so the worker has no use for its prices
+    expected = create_nav(trades, prices[prices["ticker"] == "AAA"], flows,
+                          by_account=True)
+    pd.testing.assert_frame_equal(result, expected)
+    pd.testing.assert_frame_equal(
+        result, create_nav(trades, prices, flows, by_account=True))
@@ -0,0 +1,236 @@
+import numpy as np
+import pandas as pd
+
+from opat.portfolio import create_holdings, create_pnl, create_nav, \
+    create_dividends, NavBuilder
+
+
+def make_trades():
+    return pd.DataFrame({
+        "tradeday": pd.to_datetime(["2019-01-02", "2019-01-02", "2019-01-04",
+                                    "2019-01-09", "2019-01-14", "2019-01-16"]),
+        "account": "TEST01",
+        "ticker": ["AAA", "BBB", "AAA", "BBB", "BBB", "BBB"],
+        "action": ["Buy", "Buy", "Buy", "Sell", "Buy", "Sell"],
+        "price": [10.0, 20.0, 11.0, 22.0, 21.0, 20.0],
+        "quantity": [3, 5, 4, 5, 7, 2],
+    })
+
+
+def make_splits():
+    return pd.DataFrame({
+        "tradeday": pd.to_datetime(["2019-01-03", "2019-01-08", "2019-01-15",
+                                    "2019-01-04"]),
+        "ticker": ["AAA", "AAA", "BBB", "BBB"],
+        "split": [2, 1.5, 3, 0.5],
+    })
+
+
+def make_prices():
+    dates = pd.bdate_range("2019-01-02", "2019-01-31", name="tradeday")
+    prices = []
+    for i, ticker in enumerate(["AAA", "BBB"]):
+        price = pd.DataFrame({"tradeday": dates, "ticker": ticker})
+        price["close"] = 10.0 * (i + 1) + np.arange(len(dates)) * 0.5
+        price["dividend"] = 0.0
+        price["split"] = 1.0
+        prices.append(price)
+    prices = pd.concat(prices, ignore_index=True)
+    prices.loc[prices["tradeday"] == "2019-01-10", "dividend"] = 0.25
+    return prices
+
+
+def make_flows():
+    return pd.DataFrame({
+        "tradeday": pd.to_datetime(["2019-01-02", "2019-01-12",
+                                    "2019-01-22"]),
+        "account": "TEST01",
+        "action": ["Deposit", "Deposit", "Withdrawal"],
+        "amount": [200.0, 100.0, -50.0],
+    })
+
+
+def loop_split_adjust(holdings, splits):
+    """Reference implementation of the per ticker split adjustment"""
+    splits_use = holdings.merge(splits[["tradeday", "ticker", "split"]],
+                                how="left", on=["tradeday", "ticker"])
+    splits_use["split"] = splits_use["split"].fillna(value=1)
+    result = []
+    for _, value in splits_use.groupby("ticker"):
+        value = value.set_index("tradeday")
+        value["prev_holding"] = value["quantity"].shift(1, fill_value=0)
+        value["quantity"] = (value["prev_holding"] * (value["split"] - 1)).cumsum() + value["quantity"]
+        value["quantity"] = value["quantity"].apply(np.floor)
+        result.append(value.reset_index()[["tradeday", "ticker", "quantity"]])
+    result = pd.concat(result, ignore_index=True)
+    return result.sort_values(by=["tradeday", "ticker"]).reset_index(drop=True)
+
+
+def test_split_adjustment_matches_loop():
+    trades = make_trades()
+    splits = make_splits()
+    holdings = create_holdings(trades, end_date="2019-01-31")
+    expected = loop_split_adjust(holdings, splits)
+
+    result = create_holdings(trades, splits, end_date="2019-01-31")
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_pnl_adds_up_to_gain():
+    trades = make_trades()
+    prices = make_prices()
+    pnl = create_pnl(trades, prices)
+
+    # AAA is held throughout, so its pnl adds up to the market value gain
+    # plus dividends
+    last = prices[prices["ticker"] == "AAA"].iloc[-1]
+    aaa = trades[trades["ticker"] == "AAA"]
+    gain = 7 * last["close"] - (aaa["price"] * aaa["quantity"]).sum() + \
+        7 * 0.25
+    assert np.isclose(pnl.xs("AAA", level="ticker")["pnl"].sum(), gain)
+
+
+def test_dividends_match_nav_cash():
+    trades = make_trades()
+    prices = make_prices()
+    flows = make_flows()
+
+    # BBB is sold out the day before the dividend
+    dividends = create_dividends(trades, prices)
+    assert list(dividends["ticker"]) == ["AAA"]
+    assert (dividends["tradeday"] == "2019-01-10").all()
+    assert dividends["quantity"].tolist() == [7]
+    assert np.isclose(dividends["dividend_cash"].sum(), 7 * 0.25)
+
+    by_account = create_dividends(trades, prices, by_account=True)
+    pd.testing.assert_frame_equal(by_account.drop(columns="account"),
+                                  dividends)
+
+    def cash(prices):
+        nav = create_nav(trades, prices, flows)
+        return nav[nav["type"] == "cash"].set_index("tradeday")["nav"]
+
+    income = cash(prices) - cash(prices.assign(dividend=0.0))
+    paid = dividends.groupby("tradeday")["dividend_cash"].sum().cumsum()
+    paid = paid.reindex(income.index, method="ffill").fillna(0)
+    pd.testing.assert_series_equal(income, paid, check_names=False)
+
+
+def test_nav_builder_matches_create_nav():
+    trades = make_trades()
+    prices = make_prices()
+    split = (prices["ticker"] == "AAA") & (prices["tradeday"] == "2019-01-15")
+    prices.loc[split, "split"] = 2.0
+    flows = make_flows()
+
+    end_date = pd.Timestamp("2019-01-31")
+    expected = create_nav(trades, prices, flows)
+
+    builder = NavBuilder()
+    nav = []
+    start_date = pd.Timestamp("2019-01-01")
+    for day in pd.date_range("2019-01-02", end_date):
+        def new(x):
+            return x[(x["tradeday"] > start_date) & (x["tradeday"] <= day)]
+        nav.append(builder.update(new(trades), new(prices), new(flows),
+                                  end_date=day))
+        start_date = day
+    nav = pd.concat(nav, ignore_index=True)
+
+    pd.testing.assert_frame_equal(nav, expected.reset_index(drop=True))
+
+
+def test_nav_builder_before_first_activity():
+    trades = make_trades()
+    prices = make_prices()
+    flows = make_flows()
+    expected = create_nav(trades, prices, flows)
+
+    # Days before the first trade or flow, and a batch without prices,
+    # give no nav and leave the builder as it was
+    builder = NavBuilder()
+    before = prices.assign(tradeday=prices["tradeday"] - pd.Timedelta(days=60))
+    for batch in [before, prices.iloc[:0]]:
+        nav = builder.update(trades.iloc[:0], batch, flows.iloc[:0])
+        assert nav.empty
+        assert list(nav.columns) == list(expected.columns)
+        assert builder.last_date is None
+
+    nav = builder.update(trades, prices, flows)
+    pd.testing.assert_frame_equal(nav, expected)
+
+
+def test_holdings_end_date():
+    trades = make_trades()
+    prices = make_prices()
+
+    holdings = create_holdings(trades, prices)
+    assert holdings["tradeday"].max() == prices["tradeday"].max()
+
+    holdings = create_holdings(trades, prices, end_date="2019-01-10")
+    assert holdings["tradeday"].max() == pd.Timestamp("2019-01-10")
+
+    # A table of splits only does not end the holdings at the last split
+    splits = make_splits()
+    holdings = create_holdings(trades, splits)
+    assert holdings["tradeday"].max() > prices["tradeday"].max()
+    early = splits.assign(tradeday=pd.Timestamp("2018-12-31"))
+    holdings = create_holdings(trades, early)
+    assert holdings["tradeday"].max() > prices["tradeday"].max()
+    assert set(holdings["ticker"]) == {"AAA", "BBB"}
+
+
+def test_sparse_holdings():
+    trades = make_trades()
+    splits = make_splits()
+    prices = make_prices()
+    holdings = create_holdings(trades, splits, end_date="2019-01-31")
+    sparse = create_holdings(trades, splits, end_date="2019-01-31",
+                             sparse=True)
+
+    assert len(sparse) < len(holdings)
+    pd.testing.assert_frame_equal(sparse.to_frame(), holdings)
+
+    day = holdings[holdings["tradeday"] == "2019-01-15"].reset_index(
+        drop=True)
+    pd.testing.assert_frame_equal(sparse.on("2019-01-15"), day)
+
+    expected = holdings.merge(prices, on=["tradeday", "ticker"])
+    result = sparse.join_prices(prices)
+    pd.testing.assert_frame_equal(result[expected.columns], expected)
+
+
+def test_by_account_matches_single_account():
+    trades = make_trades()
+    other = trades.iloc[1:].copy()
+    other["account"] = "TEST02"
+    other["quantity"] = other["quantity"] * 2
+    trades = pd.concat([trades, other], ignore_index=True)
+    flows = make_flows()
+    other = flows.iloc[1:].copy()
+    other["account"] = "TEST02"
+    flows = pd.concat([flows, other], ignore_index=True)
+    prices = make_prices()
+
+    holdings = create_holdings(trades, prices, by_account=True)
+    pnl = create_pnl(trades, prices, by_account=True)
+    nav = create_nav(trades, prices, flows, by_account=True)
+
+    for account in ["TEST01", "TEST02"]:
+        account_trades = trades[trades["account"] == account]
+        account_flows = flows[flows["account"] == account]
+
+        expected = create_holdings(account_trades, prices)
+        result = holdings[holdings["account"] == account]
+        result = result.drop(columns="account").reset_index(drop=True)
+        pd.testing.assert_frame_equal(result, expected)
+
+        expected = create_pnl(account_trades, prices)
+        pd.testing.assert_frame_equal(
+            pnl.xs(account, level="account"), expected)
+
+        expected = create_nav(account_trades, prices, account_flows)
+        result = nav[nav["account"] == account]
+        result = result.drop(columns="account").reset_index(drop=True)
+        pd.testing.assert_frame_equal(result, expected)
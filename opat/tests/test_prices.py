@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from opat.prices import PriceStore
+from opat.portfolio import create_pnl, create_nav
+from opat.tests.test_portfolio import make_trades, make_prices, make_flows
+
+
+def test_lookup_and_asof():
+    prices = make_prices()
+    store = PriceStore(prices)
+
+    days = pd.to_datetime(["2019-01-04", "2019-01-05", "2019-01-01",
+                           "2019-01-04"])
+    tickers = ["AAA", "AAA", "BBB", "CCC"]
+    close = prices.set_index(["tradeday", "ticker"])["close"]
+
+    result = store.lookup(days, tickers)
+    assert result.loc[0, "close"] == close[("2019-01-04", "AAA")]
+    assert result.loc[1:].isna().all().all()
+
+    result = store.asof(days, tickers, columns=["close"])
+    assert result.loc[1, "close"] == close[("2019-01-04", "AAA")]
+    assert np.isnan(result.loc[2, "close"])
+    assert np.isnan(result.loc[3, "close"])
+
+
+def test_portfolio_functions_accept_store():
+    trades = make_trades()
+    prices = make_prices()
+    flows = make_flows()
+    store = PriceStore(prices)
+
+    pd.testing.assert_frame_equal(create_pnl(trades, store),
+                                  create_pnl(trades, prices))
+    pd.testing.assert_frame_equal(create_nav(trades, store, flows),
+                                  create_nav(trades, prices, flows))
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from opat import ratios as ratios_module
+from opat.drawdown import max_drawdown
+from opat.ratios import ratios
+from opat.stats import annualized_return, annualized_std
+
+__location__ = os.path.realpath(os.path.join(
+    os.getcwd(), os.path.dirname(__file__)))
+
+
+def test_ratios_share_intermediates():
+    returns = pd.read_csv(__location__ + '/test_data/fund_return.csv',
+                          parse_dates=[0], header=0, index_col=0)
+
+    calls = []
+    compute = ratios_module._Intermediates._annualized_return
+
+    def counted(self):
+        calls.append(1)
+        return compute(self)
+
+    ratios_module._Intermediates._annualized_return = counted
+    try:
+        result = ratios(returns, benchmark="S&P 500")
+    finally:
+        ratios_module._Intermediates._annualized_return = compute
+    assert len(calls) == 1
+    assert list(result.columns) == ["sharpe", "sortino", "calmar", "omega",
+                                    "information"]
+
+    ann_return = annualized_return(returns)
+    pd.testing.assert_series_equal(
+        result["sharpe"], ann_return / annualized_std(returns),
+        check_names=False)
+    pd.testing.assert_series_equal(
+        result["calmar"], ann_return / -max_drawdown(returns),
+        check_names=False)
+
+    growth = returns.add(1)
+    omega = (growth - 1).clip(lower=0).sum() / (1 - growth).clip(lower=0).sum()
+    pd.testing.assert_series_equal(result["omega"], omega, check_names=False)
+
+    active = returns.sub(returns["S&P 500"], axis=0)
+    periods = len(returns) / ((returns.index[-1] - returns.index[0]).days / 365.25)
+    information = active.mean() * periods / (active.std() * np.sqrt(periods))
+    assert np.isclose(result.loc["Tivoli", "information"],
+                      information["Tivoli"])
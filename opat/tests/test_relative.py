@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from opat.relative import relative_stats, beta
+
+__location__ = os.path.realpath(os.path.join(
+    os.getcwd(), os.path.dirname(__file__)))
+
+
+def test_relative_stats_match_pairs():
+    returns = pd.read_csv(__location__ + '/test_data/fund_return.csv',
+                          parse_dates=[0], header=0, index_col=0)
+    rng = np.random.RandomState(0)
+    funds = pd.DataFrame(rng.normal(0, 0.01, size=(len(returns), 3)),
+                         index=returns.index, columns=["a", "b", "c"])
+    funds["Tivoli"] = returns["Tivoli"]
+    funds.iloc[3, 0] = np.nan
+    benchmarks = pd.DataFrame({"S&P 500": returns["S&P 500"],
+                               "noise": rng.normal(0, 0.01, len(returns))})
+    benchmarks.iloc[7, 1] = np.nan
+
+    result = relative_stats(funds, benchmarks)
+    years = (returns.index[-1] - returns.index[0]).days / 365.25
+    for fund in funds:
+        for benchmark in benchmarks:
+            pair = pd.concat([funds[fund], benchmarks[benchmark]],
+                             axis=1).dropna()
+            x, y = pair.iloc[:, 0], pair.iloc[:, 1]
+            periods = len(pair) / years
+            slope = x.cov(y) / y.var()
+            expected = {
+                "beta": slope,
+                "alpha": (x.mean() - slope * y.mean()) * periods,
+                "correlation": x.corr(y),
+                "tracking_error": (x - y).std() * np.sqrt(periods),
+                "up_capture": x[y > 0].mean() / y[y > 0].mean(),
+                "down_capture": x[y < 0].mean() / y[y < 0].mean(),
+            }
+            for name, value in expected.items():
+                assert np.isclose(result.loc[fund, (name, benchmark)],
+                                  value, rtol=1e-10)
+
+    single = beta(returns, "S&P 500")
+    assert np.isclose(single.loc["S&P 500", "S&P 500"], 1)
@@ -0,0 +1,89 @@
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from opat.rolling import rolling_annualized_return, rolling_stats
+from opat.stats import annualized_return, annualized_std
+
+__location__ = os.path.realpath(os.path.join(
+    os.getcwd(), os.path.dirname(__file__)))
+
+
+def test_rolling_stats_match_windows():
+    returns = pd.read_csv(__location__ + '/test_data/fund_return.csv',
+                          parse_dates=[0], header=0, index_col=0)
+    returns.iloc[5, 0] = np.nan
+    window = 20
+
+    stats = rolling_stats(returns, window)
+    assert stats.iloc[:window - 1].isna().all().all()
+
+    for end in range(window - 1, len(returns), 7):
+        sample = returns.iloc[end - window + 1:end + 1]
+        ann_return = annualized_return(sample)
+        ann_std = annualized_std(sample)
+        np.testing.assert_allclose(stats["return"].iloc[end], ann_return,
+                                   rtol=1e-9)
+        np.testing.assert_allclose(stats["std"].iloc[end], ann_std,
+                                   rtol=1e-9)
+        np.testing.assert_allclose(stats["sharpe"].iloc[end],
+                                   ann_return / ann_std, rtol=1e-9)
+
+    series = rolling_stats(returns["Tivoli"], window)
+    pd.testing.assert_series_equal(series["std"],
+                                   stats["std"]["Tivoli"].rename(None),
+                                   check_names=False)
+
+
+def test_rolling_std_long_series():
+    rng = np.random.default_rng(3)
+    index = pd.bdate_range("2000-01-03", periods=5000)
+    returns = pd.Series(rng.normal(0, 0.01, len(index)), index=index)
+    returns.iloc[2000:] += 0.05
+    returns.iloc[3000:3030] = np.nan
+    window = 20
+
+    std = rolling_stats(returns, window)["std"]
+    dates = index.to_series()
+    years = (dates - dates.shift(window - 1)).dt.days / 365.25
+    count = returns.notna().rolling(window).sum()
+    expected = returns.rolling(window, min_periods=2).std() * \
+        np.sqrt(count / years)
+    expected[count < 2] = np.nan
+    np.testing.assert_allclose(std, expected, rtol=1e-8, equal_nan=True)
+
+
+def test_rolling_window_longer_than_returns():
+    returns = pd.read_csv(__location__ + '/test_data/fund_return.csv',
+                          parse_dates=[0], header=0, index_col=0)
+    assert rolling_stats(returns.iloc[:10], 10).iloc[-1].notna().all()
+    for window in [11, 36]:
+        stats = rolling_stats(returns.iloc[:10], window)
+        assert stats.shape == (10, 3 * returns.shape[1])
+        assert stats.isna().all().all()
+        series = rolling_stats(returns["Tivoli"].iloc[:10], window)
+        assert series.shape == (10, 3)
+        assert series.isna().all().all()
+
+
+def test_rolling_return_at_or_below_minus_100_percent():
+    returns = pd.read_csv(__location__ + '/test_data/fund_return.csv',
+                          parse_dates=[0], header=0, index_col=0)
+    returns.iloc[5, 0] = -1.2
+    returns.iloc[30, 0] = -2.5
+    returns.iloc[80, 0] = -1.5
+    returns.iloc[50, 1] = -1
+    returns.iloc[60, 1] = np.nan
+    growth = returns.add(1, fill_value=0)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        rolling = rolling_annualized_return(returns, 20)
+        window = growth.rolling(20).apply(np.prod, raw=True)
+        window_years = np.asarray(
+            (returns.index[19:] - returns.index[:-19]).days / 365.25)
+        with np.errstate(invalid="ignore"):
+            expected = window.iloc[19:] ** (1 / window_years[:, None]) - 1
+        assert np.allclose(rolling.iloc[19:], expected, equal_nan=True)
@@ -1,12 +1,20 @@
 import os
+import tracemalloc
+import warnings
+
+import numpy as np
 import pandas as pd
 
-from opat.stats import (cum_return,
+from opat.stats import (total_return,
+                        cum_return,
                         vami,
                         period_return,
+                        period_returns,
+                        PERIODS,
                         annualized_return,
                         annualized_std,)
 
+from opat.stats import _period_boundaries
 from opat.portfolio import (create_holdings, create_pnl, create_nav)
 
 
@@ -25,7 +33,7 @@ def read_ts_csv(filepath):
                          header=0,
                          index_col=0)
 
-    return(result)
+    return result
 
 
 __location__ = os.path.realpath(os.path.join(
@@ -55,3 +63,152 @@ print(create_holdings(trade_data, price_data).head())
 print(create_holdings(trade_data).head())
 print(create_pnl(trade_data, price_data).head())
 print(create_nav(trade_data, price_data, flow_data))
+
+
+def test_returns_match_growth_products():
+    returns = returns_data.copy()
+    returns.iloc[3, 0] = np.nan
+    growth = returns.add(1, fill_value=0)
+
+    pd.testing.assert_series_equal(total_return(returns),
+                                   growth.prod() - 1)
+    pd.testing.assert_frame_equal(cum_return(returns),
+                                  growth.cumprod() - 1)
+    pd.testing.assert_frame_equal(vami(returns, 100), growth.cumprod() * 100)
+    pd.testing.assert_frame_equal(
+        period_return(returns, "month"),
+        growth.groupby(pd.Grouper(freq=pd.offsets.MonthEnd())).prod() - 1)
+    assert np.isclose(total_return(returns["Tivoli"]),
+                      total_return(returns)["Tivoli"])
+
+
+def test_returns_at_or_below_minus_100_percent():
+    returns = returns_data.copy()
+    returns.iloc[5, 0] = -1.2
+    returns.iloc[30, 0] = -2.5
+    returns.iloc[80, 0] = -1.5
+    returns.iloc[50, 1] = -1
+    returns.iloc[60, 1] = np.nan
+    growth = returns.add(1, fill_value=0)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        pd.testing.assert_series_equal(total_return(returns),
+                                       growth.prod() - 1)
+        pd.testing.assert_frame_equal(cum_return(returns),
+                                      growth.cumprod() - 1)
+        pd.testing.assert_frame_equal(vami(returns, 100),
+                                      growth.cumprod() * 100)
+        pd.testing.assert_frame_equal(
+            period_returns(returns, ["month"])["month"],
+            growth.groupby(pd.Grouper(freq=PERIODS["month"])).prod() - 1)
+        pd.testing.assert_frame_equal(
+            period_return(returns, "2W"),
+            growth.groupby(two_week_grouper()).prod() - 1,
+            check_freq=False)
+
+        # The compounded growth of Tivoli is negative, which has no
+        # annualized return, and the benchmark lost everything
+        annualized = annualized_return(returns)
+        assert np.isnan(annualized["Tivoli"])
+        assert annualized["S&P 500"] == -1
+
+
+def two_week_grouper():
+    """Two week buckets ending on the Sundays two weeks apart from the
+    first Sunday after the epoch, 1970-01-04, and including them"""
+    return pd.Grouper(freq=pd.Timedelta(weeks=2), closed="right",
+                      label="right", origin=pd.Timestamp("1970-01-04"))
+
+
+def test_period_returns_match_grouper():
+    returns = returns_data.drop(returns_data.index[40:90])
+    returns.iloc[3, 0] = np.nan
+
+    result = period_returns(returns.iloc[::-1])
+    assert list(result) == list(PERIODS)
+    for period, offset in PERIODS.items():
+        growth = returns.add(1, fill_value=0)
+        expected = growth.groupby(pd.Grouper(freq=offset)).prod() - 1
+        pd.testing.assert_frame_equal(result[period], expected)
+        pd.testing.assert_series_equal(period_return(returns["Tivoli"],
+                                                     period),
+                                       expected["Tivoli"])
+
+
+def test_period_return_calendars():
+    returns = returns_data
+    for alias in ["QE-JUN", "W-FRI", "BME"]:
+        expected = returns.add(1).groupby(pd.Grouper(freq=alias)).prod() - 1
+        pd.testing.assert_frame_equal(period_return(returns, alias),
+                                      expected, check_freq=False)
+
+    # Multiples of an offset are anchored at the epoch, not the first date
+    for start in range(4):
+        expected = returns.iloc[start:].add(1).groupby(
+            two_week_grouper()).prod() - 1
+        pd.testing.assert_frame_equal(
+            period_return(returns.iloc[start:], "2W"), expected,
+            check_freq=False)
+
+    fiscal = period_return(returns, "year", fiscal_year_end=6)
+    assert list(fiscal.index.month) == [6, 6, 6]
+    pd.testing.assert_frame_equal(fiscal,
+                                  period_return(returns, "YE-JUN"))
+
+    holidays = ["2018-05-31"]
+    monthly = period_return(returns, "month", holidays=holidays)
+    assert pd.Timestamp("2018-05-30") in monthly.index
+    assert pd.Timestamp("2018-06-29") in monthly.index
+    pd.testing.assert_frame_equal(
+        monthly.reset_index(drop=True),
+        period_return(returns, "month").reset_index(drop=True))
+
+    hits = _period_boundaries.cache_info().hits
+    period_return(returns, "month", holidays=holidays)
+    assert _period_boundaries.cache_info().hits == hits + 1
+
+
+def test_period_returns_in_local_time():
+    # Late evening in New York is already the next day in UTC
+    returns = returns_data.copy()
+    returns.index = (returns.index + pd.Timedelta(hours=23)).tz_localize(
+        "America/New_York")
+    growth = returns.add(1)
+
+    result = period_returns(returns)
+    for period, offset in PERIODS.items():
+        expected = growth.groupby(pd.Grouper(freq=offset)).prod() - 1
+        expected.index = expected.index.normalize()
+        pd.testing.assert_frame_equal(result[period], expected,
+                                      check_freq=False)
+        assert str(result[period].index.tz) == "America/New_York"
+
+    for alias in ["QE-JUN", "W-FRI"]:
+        expected = growth.groupby(pd.Grouper(freq=alias)).prod() - 1
+        expected.index = expected.index.normalize()
+        pd.testing.assert_frame_equal(period_return(returns, alias),
+                                      expected, check_freq=False)
+
+    holidays = ["2018-05-31"]
+    monthly = period_return(returns, "month", holidays=holidays)
+    assert pd.Timestamp("2018-05-30", tz="America/New_York") in monthly.index
+
+
+def test_cum_return_allocates_only_its_output():
+    rng = np.random.RandomState(0)
+    returns = pd.DataFrame(rng.normal(0, 0.01, size=(1000, 500)),
+                           index=pd.bdate_range("2000-01-03", periods=1000))
+    size = returns.values.nbytes
+
+    tracemalloc.start()
+    cum_return(returns)
+    cum_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    total_return(returns)
+    total_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # The output plus the mask of missing returns, and one block of rows
+    assert cum_peak < 1.25 * size
+    assert total_peak < 0.25 * size
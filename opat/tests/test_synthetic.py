@@ -0,0 +1,63 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from opat.portfolio import create_holdings
+from opat.synthetic import generate, write_csv
+
+__location__ = os.path.realpath(os.path.join(
+    os.getcwd(), os.path.dirname(__file__)))
+
+options = dict(accounts=3, tickers=15, years=2, trades_per_day=4,
+               split_rate=0.5, seed=7, chunksize=1000)
+
+
+def test_synthetic_csv_match_test_data():
+    with tempfile.TemporaryDirectory() as folder:
+        files = write_csv(folder, **options)
+        chunks = list(generate(**options))
+        assert len(chunks) > 1
+
+        for i, name in enumerate(["trades", "prices", "flows"]):
+            expected = pd.read_csv(
+                __location__ + "/test_data/{}.csv".format(name), nrows=1)
+            written = pd.read_csv(files[name], parse_dates=[0])
+            assert list(written.columns) == list(expected.columns)
+
+            generated = pd.concat([chunk[i] for chunk in chunks],
+                                  ignore_index=True)
+            pd.testing.assert_frame_equal(written, generated,
+                                          check_dtype=False)
+            assert written["tradeday"].is_monotonic_increasing
+
+
+def test_synthetic_portfolio_is_consistent():
+    trades, prices, flows = [pd.concat(frames, ignore_index=True)
+                             for frames in zip(*generate(**options))]
+    again = pd.concat([chunk[1] for chunk in generate(**options)],
+                      ignore_index=True)
+    pd.testing.assert_frame_equal(prices, again)
+
+    assert (prices["split"] != 1).any() and (prices["dividend"] > 0).any()
+    assert (prices["low"] <= prices[["open", "close"]].min(axis=1)).all()
+    assert (prices["high"] >= prices[["open", "close"]].max(axis=1)).all()
+    last = prices[prices["tradeday"] == prices["tradeday"].max()]
+    assert np.allclose(last["adj"], last["close"], atol=0.01)
+
+    assert set(trades["action"]) == {"Buy", "Sell"}
+    holdings = create_holdings(trades, prices)
+    assert (holdings["quantity"] >= 0).all()
+    assert flows.groupby("account")["tradeday"].min().eq(
+        prices["tradeday"].min()).all()
+
+
+def test_synthetic_chunksize_does_not_change_records():
+    expected = [pd.concat(frames, ignore_index=True)
+                for frames in zip(*generate(**options))]
+    for chunksize in [1, 700, 5000]:
+        chunks = list(generate(**dict(options, chunksize=chunksize)))
+        for i, frames in enumerate(zip(*chunks)):
+            pd.testing.assert_frame_equal(
+                pd.concat(frames, ignore_index=True), expected[i])
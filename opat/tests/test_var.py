@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from opat.var import value_at_risk
+
+__location__ = os.path.realpath(os.path.join(
+    os.getcwd(), os.path.dirname(__file__)))
+
+
+def read_returns():
+    return pd.read_csv(__location__ + '/test_data/fund_return.csv',
+                       parse_dates=[0], header=0, index_col=0)
+
+
+def test_historical_var_matches_quantile():
+    returns = read_returns()
+    returns.iloc[:10, 0] = np.nan
+
+    result = value_at_risk(returns, level=0.95)
+    np.testing.assert_allclose(result["var"], returns.quantile(0.05))
+    for column in returns:
+        ordered = returns[column].dropna().sort_values()
+        lower = int(np.floor(0.05 * (len(ordered) - 1)))
+        assert np.isclose(result.loc[column, "es"],
+                          ordered.iloc[:lower + 1].mean())
+
+
+def test_monte_carlo_var_is_seeded():
+    returns = read_returns()
+
+    gaussian = value_at_risk(returns, method="gaussian")
+    first = value_at_risk(returns, method="monte-carlo", simulations=100000,
+                          chunksize=30000, seed=1, workers=2)
+    second = value_at_risk(returns, method="monte-carlo", simulations=100000,
+                           chunksize=30000, seed=1, workers=1)
+    pd.testing.assert_frame_equal(first, second)
+    np.testing.assert_allclose(first, gaussian, rtol=0.05)
+
+    cornish_fisher = value_at_risk(returns, method="cornish-fisher")
+    assert (cornish_fisher["es"] <= cornish_fisher["var"]).all()
@@ -0,0 +1,274 @@
+#
+# Copyright 2019 Shawn Lin
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+import numpy as np
+import pandas as pd
+from statistics import NormalDist
+
+from concurrent.futures import ProcessPoolExecutor
+
+from .stats import _growth_signs, _log_growth, _values
+
+METHODS = ("historical", "gaussian", "cornish-fisher", "monte-carlo")
+
+
+def _tail(smallest, count, level):
+    """
+    VaR and ES from the smallest values of each column
+
+    The VaR is the 1 - level quantile with linear interpolation, as
+    np.quantile computes it, and the ES is the mean of the values up to the
+    lower of the two interpolated values.
+
+    Parameters
+    ----------
+    smallest : np.ndarray, the smallest values of each column in ascending
+        order, at least floor((1 - level) * (count - 1)) + 2 rows, nan past
+        the count of a column
+    count : np.ndarray, number of values of each column
+    level : float, confidence level
+
+    Returns
+    -------
+    var, es : np.ndarray
+    """
+    position = (1 - level) * (count - 1)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, np.maximum(count - 1, 0))
+    columns = np.arange(smallest.shape[1])
+
+    low = smallest[lower, columns]
+    high = smallest[upper, columns]
+    var = low + (high - low) * (position - lower)
+
+    rows = np.arange(len(smallest))[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        es = np.where(rows <= lower, smallest, 0).sum(axis=0) / (lower + 1)
+
+    empty = count < 1
+    var[empty] = np.nan
+    es[empty] = np.nan
+
+    return var, es
+
+
+def _historical(values, level):
+    """VaR and ES of the observed returns, partitioning instead of sorting"""
+    count = np.count_nonzero(~np.isnan(values), axis=0)
+    keep = int(np.floor((1 - level) * (max(len(values), 1) - 1))) + 2
+    keep = min(keep, len(values))
+
+    # nan sorts after every number, so each column's smallest values come
+    # first. Only those are sorted.
+    smallest = np.partition(values, keep - 1, axis=0)[:keep]
+    smallest.sort(axis=0)
+
+    return _tail(smallest, count, level)
+
+
+def _moments(values):
+    """Mean, standard deviation, skewness and excess kurtosis of each column"""
+    frame = pd.DataFrame(values)
+    return (frame.mean().to_numpy(), frame.std().to_numpy(),
+            frame.skew().to_numpy(), frame.kurt().to_numpy())
+
+
+def _gaussian(values, level):
+    """VaR and ES of a normal distribution fitted to the returns"""
+    mean, std = _moments(values)[:2]
+    normal = NormalDist()
+    z = normal.inv_cdf(1 - level)
+
+    var = mean + z * std
+    es = mean - std * normal.pdf(z) / (1 - level)
+
+    return var, es
+
+
+def _cornish_fisher_z(z, skew, kurt):
+    """Quantile z of the normal adjusted for skewness and excess kurtosis"""
+    adjusted = z + (z ** 2 - 1) * skew / 6 + (z ** 3 - 3 * z) * kurt / 24
+    return adjusted - (2 * z ** 3 - 5 * z) * skew ** 2 / 36
+
+
+def _cornish_fisher(values, level, steps=1000):
+    """
+    VaR and ES with the Cornish-Fisher expansion of the normal quantile
+
+    The ES is the mean of the adjusted quantiles over the tail, integrated
+    with the midpoint rule on steps levels.
+    """
+    mean, std, skew, kurt = _moments(values)
+    normal = NormalDist()
+
+    z = normal.inv_cdf(1 - level)
+    var = mean + _cornish_fisher_z(z, skew, kurt) * std
+
+    tail = (np.arange(steps) + 0.5) / steps * (1 - level)
+    z = np.array([normal.inv_cdf(p) for p in tail])[:, None]
+    es = mean + _cornish_fisher_z(z, skew, kurt).mean(axis=0) * std
+
+    return var, es
+
+
+def _simulate_chunk(model, parameters, size, horizon, seed, keep):
+    """
+    Simulate returns over the horizon and keep the smallest of each column
+
+    Parameters
+    ----------
+    model : "normal" or "bootstrap"
+    parameters : (mean, std) of log growth for normal, the log growth
+        history for bootstrap
+    size : int, number of simulations
+    horizon : int, number of periods compounded in each simulation
+    seed : np.random.SeedSequence of the chunk
+    keep : int, number of the smallest simulated returns to keep
+
+    Returns
+    -------
+    smallest : np.ndarray
+        The keep smallest simulated returns of each column, unordered.
+    """
+    rng = np.random.default_rng(seed)
+
+    if model == "normal":
+        mean, std = parameters
+        total = rng.standard_normal((size, len(mean)))
+        total *= std * np.sqrt(horizon)
+        total += mean * horizon
+    else:
+        total = np.zeros((size, parameters.shape[1]))
+        for _ in range(horizon):
+            total += parameters[rng.integers(len(parameters), size=size)]
+    np.expm1(total, out=total)
+
+    if keep < size:
+        total = np.partition(total, keep - 1, axis=0)[:keep]
+    return total
+
+
+def _monte_carlo(values, level, simulations, horizon, model, chunksize,
+                 seed, workers):
+    """
+    VaR and ES of simulated returns, simulated in chunks in a process pool
+
+    Each chunk gets its own seed spawned from seed, so the result does not
+    depend on the number of workers. Only the smallest simulated returns
+    needed for the tail are kept from each chunk.
+    """
+    if model not in ("normal", "bootstrap"):
+        raise ValueError("model must be 'normal' or 'bootstrap'")
+    # Both models simulate log growth, which needs positive growth factors
+    if _growth_signs(values) is not None:
+        raise ValueError("monte-carlo needs returns above -100%")
+
+    growth = _log_growth(values)
+    if model == "normal":
+        growth[np.isnan(values)] = np.nan
+        parameters = (np.nanmean(growth, axis=0),
+                      np.nanstd(growth, axis=0, ddof=1))
+    else:
+        parameters = growth
+
+    keep = min(int(np.floor((1 - level) * (simulations - 1))) + 2,
+               simulations)
+    sizes = [min(chunksize, simulations - start)
+             for start in range(0, simulations, chunksize)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if workers is None:
+        workers = os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_simulate_chunk, model, parameters, size,
+                                   horizon, chunk_seed, min(keep, size))
+                   for size, chunk_seed in zip(sizes, seeds)]
+        smallest = None
+        for future in futures:
+            chunk = future.result()
+            if smallest is not None:
+                chunk = np.concatenate([smallest, chunk])
+            if len(chunk) > keep:
+                chunk = np.partition(chunk, keep - 1, axis=0)[:keep]
+            smallest = chunk
+
+    smallest = np.sort(smallest, axis=0)
+    count = np.full(values.shape[1], simulations)
+
+    return _tail(smallest, count, level)
+
+
+def value_at_risk(returns, level=0.95, method="historical",
+                  simulations=100000, horizon=1, model="normal",
+                  chunksize=10000, seed=None, workers=None):
+    """
+    Compute the Value-at-Risk and Expected Shortfall (CVaR) of periodic
+    returns
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame of periodic returns
+    level : float, optional
+        Confidence level, 0.95 for the 5% worst returns
+    method : str, optional
+        - historical: quantile of the observed returns
+        - gaussian: normal distribution with the mean and standard deviation
+          of the returns
+        - cornish-fisher: normal quantile adjusted for the skewness and
+          kurtosis of the returns
+        - monte-carlo: quantile of simulated returns
+    simulations : int, optional
+        Number of Monte Carlo simulations
+    horizon : int, optional
+        Number of periods compounded in each Monte Carlo simulation
+    model : str, optional
+        Monte Carlo model of the log growth of each period, "normal" or
+        "bootstrap" to resample the observed periods
+    chunksize : int, optional
+        Number of Monte Carlo simulations held in memory by each worker
+    seed : int, optional
+        Seed of the Monte Carlo simulations
+    workers : int, optional
+        Number of processes for the Monte Carlo simulations, defaults to the
+        number of CPUs
+
+    Returns
+    -------
+    risk : pd.DataFrame
+        Columns var and es, the return at the 1 - level quantile and the
+        mean return beyond it, one row per series. Losses are negative.
+    """
+    if method not in METHODS:
+        raise ValueError("method must be one of {}".format(METHODS))
+    if not 0 < level < 1:
+        raise ValueError("level must be between 0 and 1")
+
+    if isinstance(returns, pd.Series):
+        returns = returns.to_frame()
+    values = _values(returns)
+
+    if method == "historical":
+        var, es = _historical(values, level)
+    elif method == "gaussian":
+        var, es = _gaussian(values, level)
+    elif method == "cornish-fisher":
+        var, es = _cornish_fisher(values, level)
+    else:
+        var, es = _monte_carlo(values, level, simulations, horizon, model,
+                               chunksize, seed, workers)
+
+    return pd.DataFrame({"var": var, "es": es}, index=returns.columns)
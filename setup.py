@@ -20,7 +20,7 @@ VERSION = "0.0.2"
 classifiers = ['Development Status :: 1 - Planning',
                'Programming Language :: Python',
                'Programming Language :: Python :: 3',
-               'Programming Language :: Python :: 3.7',
+               'Programming Language :: Python :: 3.9',
                'License :: OSI Approved :: Apache Software License',
                'Intended Audience :: Science/Research',
                'Topic :: Scientific/Engineering',
@@ -33,10 +33,14 @@ else:
     support_ipython_6 = False
 
 install_reqs = [
-    'numpy>=1.11.1',
-    'pandas>=0.18.1',
+    'numpy>=1.17.0',
+    'pandas>=0.24.0',
 ]
 
+extras_reqs = {
+    'parquet': ['pyarrow'],
+}
+
 test_reqs = []
 
 if __name__ == "__main__":
@@ -53,6 +57,8 @@ if __name__ == "__main__":
         packages=['opat', 'opat.tests'],
         classifiers=classifiers,
         install_requires=install_reqs,
+        extras_require=extras_reqs,
         tests_require=test_reqs,
+        python_requires='>=3.9',
         test_suite='nose.collector',
     )